@@ -0,0 +1,228 @@
+// Client-side versions of the dashboard charts (dash_app.py, mode='client').
+// The prepared catalog columns arrive once in the 'dashboard-data' store and every
+// dropdown change is turned into a figure here, without a request to the server.
+// The traces follow what plotly express builds for the same charts in dash_app.py;
+// catalogs above dash_app.LARGE_CATALOG_ROWS send the server-side figures instead.
+
+(function () {
+    const decoded = new WeakMap();
+
+    const TYPED = {f4: Float32Array, f8: Float64Array, i1: Int8Array, i2: Int16Array, i4: Int32Array};
+
+    const decodeTyped = (spec) => {
+        const bytes = Uint8Array.from(atob(spec.bdata), c => c.charCodeAt(0));
+        return new TYPED[spec.dtype](bytes.buffer);
+    };
+
+    // plain arrays with null for missing values, decoded once per store payload
+    const decodeColumn = (spec) => {
+        if (Array.isArray(spec)) {
+            return spec;
+        }
+        if (spec.categories) {
+            return Array.from(decodeTyped(spec.codes), code => code < 0 ? null : spec.categories[code]);
+        }
+        return Array.from(decodeTyped(spec), value => Number.isNaN(value) ? null : value);
+    };
+
+    const column = (data, name) => {
+        let columns = decoded.get(data);
+        if (!columns) {
+            columns = {};
+            decoded.set(data, columns);
+        }
+        if (!(name in columns)) {
+            columns[name] = decodeColumn(data.columns[name]);
+        }
+        return columns[name];
+    };
+
+    const pick = (values, rows) => rows.map(i => values[i]);
+
+    // row indices per value, in the given order or else in order of first appearance
+    // (rows with a missing value are left out, like the groupby in plotly express)
+    const groupRows = (values, order) => {
+        const groups = new Map();
+        (order || []).forEach(key => groups.set(key, []));
+        values.forEach((key, i) => {
+            if (key === null) {
+                return;
+            }
+            if (!groups.has(key)) {
+                groups.set(key, []);
+            }
+            groups.get(key).push(i);
+        });
+        return Array.from(groups, ([key, rows]) => ({key: key, rows: rows})).filter(group => group.rows.length);
+    };
+
+    const colorway = (data) => data.template.layout.colorway;
+
+    const figure = (data, traces, layout) => ({
+        data: traces,
+        layout: Object.assign({template: data.template, legend: {tracegroupgap: 0}}, layout)
+    });
+
+    // hover text in plotly express order: color column, x, y (an axis showing the color
+    // column takes its place in the first line)
+    const hoverTemplate = (named, colorLabel, key, xLabel, yLabel) => {
+        const colorValue = colorLabel === xLabel ? '%{x}' : colorLabel === yLabel ? '%{y}' : String(key);
+        const lines = [colorLabel + '=' + colorValue];
+        if (xLabel !== colorLabel) {
+            lines.push(xLabel + '=%{x}');
+        }
+        if (yLabel !== colorLabel) {
+            lines.push(yLabel + '=%{y}');
+        }
+        return (named ? '<b>%{hovertext}</b><br><br>' : '') + lines.join('<br>') + '<extra></extra>';
+    };
+
+    const axisTitles = (x, y) => ({xaxis: {title: {text: x}}, yaxis: {title: {text: y}}});
+
+    // one trace per P_HABITABLE value, colored from colors (cycled)
+    const byHabitability = (data, colors, order, makeTrace) => {
+        const groups = groupRows(column(data, 'P_HABITABLE'), order);
+        return groups.map((group, i) => Object.assign({
+            name: String(group.key),
+            legendgroup: String(group.key),
+            marker: {color: colors[i % colors.length]},
+            hovertext: pick(column(data, 'P_NAME'), group.rows)
+        }, makeTrace(group)));
+    };
+
+    const scatter = (data, x, y, title, labels, order) => {
+        const traces = byHabitability(data, colorway(data), order, group => ({
+            type: 'scatter',
+            mode: 'markers',
+            x: pick(column(data, x), group.rows),
+            y: pick(column(data, y), group.rows),
+            hovertemplate: hoverTemplate(true, labels.hab, group.key, labels.x, labels.y)
+        }));
+        return figure(data, traces, Object.assign({title: {text: title}, legend: {title: {text: labels.hab}}},
+            axisTitles(labels.x, labels.y)));
+    };
+
+    const habitabilityScatter = (factor, data) => {
+        const label = factor.replace('_', ' ');
+        const fig = scatter(data, factor, 'P_HABITABLE', label + ' vs. Habitability Index',
+            {x: label, y: 'Habitability Index', hab: 'Habitability Index'}, [0, 1]);
+        fig.layout.yaxis.tickvals = [0, 1];
+        return fig;
+    };
+
+    const SCATTERS = {
+        mass_radius: ['P_MASS', 'P_RADIUS', 'Mass vs Radius'],
+        temp_semi_major: ['P_SEMI_MAJOR_AXIS', 'P_TEMP_EQUIL', 'Equilibrium Temperature vs Semi-Major Axis'],
+        esi_habitability: ['P_ESI', 'P_HABITABLE', 'Earth Similarity Index vs Habitability']
+    };
+
+    const additionalScatter = (option, data) => {
+        if (!(option in SCATTERS)) {
+            return window.dash_clientside.no_update;
+        }
+        const [x, y, title] = SCATTERS[option];
+        return scatter(data, x, y, title, {x: x, y: y, hab: 'P_HABITABLE'});
+    };
+
+    const histogram = (option, data) => {
+        if (option === 'P_PERIOD') {
+            const traces = byHabitability(data, ['orange', 'skyblue'], null, group => ({
+                type: 'histogram',
+                bingroup: 'x',
+                x: pick(column(data, 'P_PERIOD'), group.rows),
+                hovertemplate: hoverTemplate(false, 'P_HABITABLE', group.key, 'P_PERIOD', 'count')
+            }));
+            return figure(data, traces, Object.assign({title: {text: 'Distribution of Orbital Periods'},
+                legend: {title: {text: 'P_HABITABLE'}}, barmode: 'relative'}, axisTitles('P_PERIOD', 'count')));
+        }
+        const types = column(data, 'P_TYPE_TEMP');
+        const colors = ['red', 'skyblue', 'orange'];
+        const traces = groupRows(types).map((group, i) => ({
+            type: 'histogram',
+            bingroup: 'x',
+            name: group.key,
+            legendgroup: group.key,
+            marker: {color: colors[i % colors.length]},
+            x: pick(types, group.rows),
+            hovertemplate: 'P_TYPE_TEMP=%{x}<br>count=%{y}<extra></extra>'
+        }));
+        return figure(data, traces, Object.assign({title: {text: 'Distribution of Planetary Types'},
+            legend: {title: {text: 'P_TYPE_TEMP'}}, barmode: 'relative'}, axisTitles('P_TYPE_TEMP', 'count')));
+    };
+
+    const BOXPLOTS = {
+        mass_radius_type: ['P_TYPE_TEMP', 'P_MASS', 'Mass by Planet Type'],
+        temp_habitability: ['P_HABITABLE', 'P_TEMP_EQUIL', 'Equilibrium Temperature by Habitability']
+    };
+
+    const boxplot = (option, data) => {
+        if (!(option in BOXPLOTS)) {
+            return window.dash_clientside.no_update;
+        }
+        const [x, y, title] = BOXPLOTS[option];
+        const traces = byHabitability(data, ['orange', 'skyblue'], null, group => ({
+            type: 'box',
+            alignmentgroup: 'True',
+            offsetgroup: String(group.key),
+            x: pick(column(data, x), group.rows),
+            y: pick(column(data, y), group.rows),
+            hovertemplate: hoverTemplate(true, 'P_HABITABLE', group.key, x, y)
+        }));
+        if (option === 'mass_radius_type') {
+            traces.push({type: 'box', name: 'Radius', marker: {color: 'lightgreen'},
+                         x: column(data, 'P_TYPE_TEMP'), y: column(data, 'P_RADIUS')});
+        }
+        return figure(data, traces, Object.assign({title: {text: title}, legend: {title: {text: 'P_HABITABLE'}},
+            boxmode: option === 'mass_radius_type' ? 'group' : 'overlay'}, axisTitles(x, y)));
+    };
+
+    const barchart = (option, data) => {
+        if (option === 'stellar_type') {
+            const traces = byHabitability(data, ['orange', 'skyblue'], null, group => ({
+                type: 'bar',
+                x: pick(column(data, 'S_TYPE'), group.rows),
+                y: group.rows.map(() => 1),
+                hovertemplate: hoverTemplate(true, 'P_HABITABLE', group.key, 'S_TYPE', 'count')
+            }));
+            return figure(data, traces, Object.assign({title: {text: 'Number of Exoplanets per Stellar Type'},
+                legend: {title: {text: 'P_HABITABLE'}}, barmode: 'relative'}, axisTitles('S_TYPE', 'count')));
+        }
+        // most common value first, like value_counts()
+        const groups = groupRows(column(data, 'P_HABITABLE')).sort((a, b) => b.rows.length - a.rows.length);
+        const colors = {0: '#FF5733', 1: '#28A745'};
+        const traces = groups.map((group, i) => ({
+            type: 'bar',
+            name: String(group.key),
+            legendgroup: String(group.key),
+            marker: {color: colors[group.key] || colorway(data)[i % colorway(data).length]},
+            x: [group.key],
+            y: [group.rows.length],
+            hovertemplate: 'P_HABITABLE=%{x}<br>count=%{y}<extra></extra>'
+        }));
+        return figure(data, traces, Object.assign({title: {text: 'Count of Habitable vs Non-Habitable Planets'},
+            legend: {title: {text: 'P_HABITABLE'}}, barmode: 'relative'}, axisTitles('P_HABITABLE', 'count')));
+    };
+
+    // large catalogs come as ready-made figures per chart and dropdown value; a dropdown
+    // value the server does not know (dash_app.CLIENT_OPTIONS) leaves the chart as it is,
+    // as PreventUpdate does for the server callbacks
+    const precomputed = (chart, draw) => (option, data) => {
+        if (data.figures) {
+            return data.figures[chart][option] || window.dash_clientside.no_update;
+        }
+        if (!data.options[chart].includes(option)) {
+            return window.dash_clientside.no_update;
+        }
+        return draw(option, data);
+    };
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        exoplanets: {
+            habitabilityScatter: precomputed('habitability_scatter', habitabilityScatter),
+            additionalScatter: precomputed('additional_scatter', additionalScatter),
+            histogram: precomputed('histogram', histogram),
+            boxplot: precomputed('boxplot', boxplot),
+            barchart: precomputed('barchart', barchart)
+        }
+    });
+})();
@@ -0,0 +1,335 @@
+import argparse
+import json
+import platform
+import string
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from werkzeug.datastructures import MultiDict
+
+from catalog import SCHEMA, StarIndex, apply_schema, system_digests
+
+
+#Microbenchmarks for the rendering and dashboard hot paths.
+#Every benchmark runs against seeded synthetic catalogs of a few sizes and records the
+#best wall time over a few repeats, the peak traced memory of one extra run and the size
+#of what it produced. Results can be saved as a JSON baseline and compared against one;
+#anything slower or hungrier than the baseline by more than the threshold is reported
+#and makes the run exit with status 1.
+#
+#    python benchmark.py --save benchmark_baseline.json
+#    python benchmark.py --compare benchmark_baseline.json --threshold 0.25
+#
+#--startup reports the cold start of the app instead: import time per module and the
+#time until the first request has been answered, in a fresh interpreter.
+#
+#    python benchmark.py --startup
+
+DEFAULT_SIZES = [10, 1000, 10000, 100000]
+DEFAULT_THRESHOLD = 0.25
+# whole-page renders are capped to this many systems (plotly serializer: PLOTLY_SYSTEMS)
+PLOT_SYSTEMS = 20
+PLOTLY_SYSTEMS = 3
+# a 50x50 sphere is 60 kB, so sphere benchmarks stop at this many stars
+SPHERE_STARS = 1000
+# compound filter timed against search.SearchIndex (the /api/planets example)
+SEARCH_QUERY = MultiDict([('habitable', '1'), ('esi_min', '0.8'), ('s_type', 'M*'), ('hz', 'conservative')])
+
+SPECTRAL_CLASSES = [('M', 2400, 3900, 0.55), ('K', 3900, 5300, 0.2), ('G', 5300, 6000, 0.15), ('F', 6000, 7300, 0.1)]
+FACILITIES = ['Kepler', 'K2', 'Transiting Exoplanet Survey Satellite (TESS)', 'European Southern Observatory',
+              'W. M. Keck Observatory', 'SPECULOOS Southern Observatory']
+
+
+def _log_uniform(rng, low, high, size):
+    return np.exp(rng.uniform(np.log(low), np.log(high), size))
+
+
+#Synthetic catalog with the same schema as hwc_3d_data.csv.
+#Systems hold 1-8 planets (geometric, like the observed multiplicity), spaced by period
+#ratios of 1.3-2.5 around stars drawn from M/K/G/F main sequence ranges; habitable zone
+#limits, equilibrium temperatures and the habitability flags follow from the stellar
+#luminosity, and a few measurements are missing as in the real archive.
+def synthetic_catalog(num_planets, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = []
+    while sum(sizes) < num_planets:
+        sizes.append(int(min(rng.geometric(0.45), 8, num_planets - sum(sizes))))
+    num_stars = len(sizes)
+    star_of = np.repeat(np.arange(num_stars), sizes)
+    order = np.concatenate([np.arange(k) for k in sizes])
+
+    classes = rng.choice(len(SPECTRAL_CLASSES), num_stars, p=[c[3] for c in SPECTRAL_CLASSES])
+    low = np.array([SPECTRAL_CLASSES[c][1] for c in classes])
+    high = np.array([SPECTRAL_CLASSES[c][2] for c in classes])
+    temperature = rng.uniform(low, high)
+    radius = np.clip((temperature / 5772) ** 1.8 * rng.lognormal(0, 0.1, num_stars), 0.08, 3)
+    luminosity = radius ** 2 * (temperature / 5772) ** 4
+    mass = radius ** 1.25
+    subtype = rng.integers(0, 10, num_stars)
+    star_type = [f'{SPECTRAL_CLASSES[c][0]}{s} V' for c, s in zip(classes, subtype)]
+
+    stars = pd.DataFrame({
+        'S_NAME': [f'SYN-{i:06d}' for i in range(num_stars)],
+        'S_TYPE': star_type,
+        'S_RA': rng.uniform(0, 360, num_stars),
+        'S_DEC': np.rad2deg(np.arcsin(rng.uniform(-1, 1, num_stars))),
+        'S_RADIUS': radius,
+        'S_TEMPERATURE': temperature,
+        'S_LUMINOSITY': luminosity,
+        'S_DISTANCE': rng.lognormal(np.log(300), 1.0, num_stars),
+        'S_HZ_OPT_MIN': np.sqrt(luminosity / 1.776),
+        'S_HZ_OPT_MAX': np.sqrt(luminosity / 0.32),
+        'S_HZ_CON_MIN': np.sqrt(luminosity / 1.107),
+        'S_HZ_CON_MAX': np.sqrt(luminosity / 0.356),
+        'S_TIDAL_LOCK': 0.5 * mass ** (1 / 3),
+        'S_SNOW_LINE': 2.7 * np.sqrt(luminosity),
+    })
+    planets = stars.iloc[star_of].reset_index(drop=True)
+
+    first = _log_uniform(rng, 0.01, 0.2, num_stars)[star_of] * mass[star_of] ** (1 / 3)
+    spacing = _log_uniform(rng, 1.3, 2.5, num_planets) ** (2 / 3)
+    spacing[order == 0] = 1
+    semi_major_axis = first * pd.Series(spacing).groupby(star_of).cumprod().to_numpy()
+    period = 365.25 * np.sqrt(semi_major_axis ** 3 / mass[star_of])
+    planet_radius = _log_uniform(rng, 0.5, 15, num_planets)
+    planet_mass = (np.where(planet_radius < 1.23, planet_radius ** 2.06, 1.4 * planet_radius ** 1.7)
+                   * rng.lognormal(0, 0.2, num_planets))
+    flux = planets['S_LUMINOSITY'].to_numpy() / semi_major_axis ** 2
+    temp_equil = 278.6 * flux ** 0.25
+    in_opt = (semi_major_axis >= planets['S_HZ_OPT_MIN']) & (semi_major_axis <= planets['S_HZ_OPT_MAX'])
+    in_con = (semi_major_axis >= planets['S_HZ_CON_MIN']) & (semi_major_axis <= planets['S_HZ_CON_MAX'])
+    rocky = planet_radius < 2.5
+    esi = 1 - np.sqrt(0.5 * ((planet_radius - 1) / (planet_radius + 1)) ** 2 + 0.5 * ((flux - 1) / (flux + 1)) ** 2)
+
+    planets = planets.assign(
+        P_NAME=planets['S_NAME'] + ' ' + np.array(list(string.ascii_lowercase))[order + 1],
+        P_DETECTION=rng.choice(['Transit', 'Radial Velocity'], num_planets, p=[0.75, 0.25]),
+        P_DISCOVERY_FACILITY=rng.choice(FACILITIES, num_planets),
+        P_TYPE_TEMP=np.where(temp_equil > 320, 'Hot', np.where(temp_equil > 200, 'Warm', 'Cold')),
+        P_HABZONE_OPT=in_opt.astype(int),
+        P_HABZONE_CON=in_con.astype(int),
+        P_HABITABLE=np.where(in_con & rocky, 1, np.where(in_opt & rocky, 2, 0)),
+        P_SEMI_MAJOR_AXIS=semi_major_axis,
+        P_PERIOD=np.where(rng.random(num_planets) < 0.02, np.nan, period),
+        P_ECCENTRICITY=np.where(rng.random(num_planets) < 0.1, np.nan,
+                                np.clip(rng.beta(0.867, 3.03, num_planets), 0, 0.95)),
+        P_INCLINATION=90 - np.abs(rng.normal(0, 1.5, num_planets)),
+        P_YEAR=rng.integers(1995, 2025, num_planets).astype(float),
+        P_RADIUS=planet_radius,
+        P_MASS=planet_mass,
+        P_DENSITY=5.51 * planet_mass / planet_radius ** 3,
+        P_TEMP_EQUIL=temp_equil,
+        P_TEMP_SURF=np.where(rng.random(num_planets) < 0.1, np.nan, temp_equil * 1.13),
+        P_FLUX=flux,
+        P_ESI=esi,
+    )
+    return apply_schema(planets[list(SCHEMA)])
+
+
+def output_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(output_size(item) for item in value)
+    if isinstance(value, dict):
+        return len(json.dumps(value, default=str).encode('utf-8'))
+    if hasattr(value, 'to_json'):  # plotly figures
+        return len(value.to_json().encode('utf-8'))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+#(name, function) pairs for one catalog; each function returns what it produced
+def benchmarks(frame):
+    import correlation
+    import dash_app
+    import galaxy
+    import geometry
+    import search
+    import test
+    from ephemeris import frame_times, planet_positions
+
+    star_index = StarIndex(frame)
+    sky = galaxy.GalaxyIndex(star_index)
+    finder = search.SearchIndex(frame)
+    stars = frame.iloc[[system.start for system in star_index.systems]]
+    prepared = dash_app.prepare_dataset(frame)
+    a = frame['P_SEMI_MAJOR_AXIS'].to_numpy(dtype=float)
+    inc = frame['P_INCLINATION'].to_numpy(dtype=float)
+    ecc = frame['P_ECCENTRICITY'].to_numpy(dtype=float)
+    periods = frame['P_PERIOD'].to_numpy(dtype=float)
+    star_radii = stars['S_RADIUS'].to_numpy(dtype=float)[:SPHERE_STARS]
+    hz_shells = list(zip(stars['S_HZ_OPT_MIN'].to_numpy(dtype=float)[:SPHERE_STARS],
+                         stars['S_HZ_OPT_MAX'].to_numpy(dtype=float)[:SPHERE_STARS]))
+    page = frame.iloc[:star_index.systems[min(PLOT_SYSTEMS, len(star_index)) - 1].stop]
+    plotly_page = frame.iloc[:star_index.systems[min(PLOTLY_SYSTEMS, len(star_index)) - 1].stop]
+
+    cases = [
+        ('ra_dec_to_cartesian', lambda: test.ra_dec_to_cartesian(stars['S_RA'].to_numpy(), stars['S_DEC'].to_numpy(),
+                                                                 stars['S_DISTANCE'].to_numpy())),
+        ('generate_orbit', lambda: [geometry.generate_orbit(a[i], inc[i]) for i in range(len(a))]),
+        ('generate_orbits', lambda: geometry.generate_orbits(a, inc, eccentricities=ecc)),
+        ('generate_sphere', lambda: [geometry.generate_sphere(r) for r in star_radii]),
+        ('shell_mesh', lambda: [geometry.shell_mesh(inner, outer, geometry.pixels_per_unit(outer))
+                                for inner, outer in hz_shells]),
+        ('planet_positions', lambda: planet_positions(a, ecc, inc, periods, frame_times(periods))),
+        ('star_index', lambda: StarIndex(frame)),
+        ('system_digests', lambda: system_digests(StarIndex(frame))),
+        ('galaxy_index', lambda: galaxy.GalaxyIndex(star_index)),
+        ('search_index', lambda: search.SearchIndex(frame)),
+        ('search_query', lambda: finder.records(finder.rows(search.parse_filters(SEARCH_QUERY))[:search.DEFAULT_LIMIT])),
+        ('galaxy_queries', lambda: [(sky.within(point, 20), sky.nearest(point, 10)) for point in sky.points[:100]]),
+        ('correlation', lambda: correlation.StreamingCorrelation.from_frame(
+            prepared, ["P_MASS", "P_RADIUS", "P_TEMP_EQUIL", "P_ESI", "P_HABITABLE"]).matrix()),
+        (f'generate_plots[{PLOT_SYSTEMS} systems]', lambda: test.generate_plots(page)),
+        (f'generate_plots[plotly, {PLOTLY_SYSTEMS} systems]',
+         lambda: test.generate_plots(plotly_page, serializer='plotly')),
+        (f'generate_plots[parametric, {PLOT_SYSTEMS} systems]', lambda: test.generate_plots(page, frame_mode='parametric')),
+    ]
+    charts = [('habitability_bar', None), ('heatmap', None)]
+    charts += [(chart, option) for chart, options in dash_app.CLIENT_OPTIONS.items() for option in options]
+    for chart, option in charts:
+        name = f'dash:{chart}' + (f':{option}' if option else '')
+        cases.append((name, lambda chart=chart, option=option: dash_app.FIGURE_BUILDERS[chart](prepared, option)))
+    cases.append(('dash:client_dataset', lambda: dash_app.client_dataset(prepared)))
+    return cases
+
+
+def measure(function, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    size = output_size(result)
+    del result
+
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(timings), 'peak_bytes': peak, 'output_bytes': size}
+
+
+def run(sizes=DEFAULT_SIZES, repeat=3, only=None, seed=0):
+    results = {}
+    for size in sizes:
+        frame = synthetic_catalog(size, seed=seed)
+        for name, function in benchmarks(frame):
+            if only and not any(pattern in name for pattern in only):
+                continue
+            key = f'{size}/{name}'
+            results[key] = measure(function, repeat)
+            r = results[key]
+            print(f"{key:55} {r['seconds'] * 1e3:10.2f} ms {r['peak_bytes'] / 2 ** 20:9.2f} MiB "
+                  f"{r['output_bytes'] / 1024:10.1f} KiB")
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'seed': seed,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+#Importing module in a fresh interpreter under python -X importtime, then answering one
+#request for path with its app. Returns the import and first request times (seconds) and
+#(module, self seconds, cumulative seconds) for every module imported on the way.
+def startup_report(module='vis', path='/'):
+    code = (f"import time; start = time.perf_counter(); import {module}; ready = time.perf_counter(); "
+            f"{module}.app.test_client().get({path!r}); "
+            f"print(ready - start, time.perf_counter() - ready)")
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            check=True)
+    import_seconds, request_seconds = (float(value) for value in result.stdout.split()[-2:])
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return import_seconds, request_seconds, modules
+
+
+def print_startup_report(module='vis', path='/', top=15):
+    import_seconds, request_seconds, modules = startup_report(module, path)
+    print(f"import {module}: {import_seconds * 1e3:.0f} ms, first request to {path}: {request_seconds * 1e3:.0f} ms")
+    packages = {}
+    for name, self_seconds, _ in modules:
+        packages[name.split('.')[0]] = packages.get(name.split('.')[0], 0.0) + self_seconds
+    print(f"\n{'package':40} {'import ms':>10}")
+    for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"{name:40} {seconds * 1e3:10.1f}")
+    print(f"\n{'module':55} {'self ms':>10} {'total ms':>10}")
+    for name, self_seconds, cumulative in sorted(modules, key=lambda row: -row[1])[:top]:
+        print(f"{name:55} {self_seconds * 1e3:10.1f} {cumulative * 1e3:10.1f}")
+
+
+#Benchmarks whose time or peak memory grew by more than threshold (a fraction) over the
+#baseline. Times under min_seconds are too noisy to compare and are skipped.
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_seconds=1e-3):
+    regressions = []
+    for key, current in results['results'].items():
+        previous = baseline['results'].get(key)
+        if previous is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if metric == 'seconds' and previous[metric] < min_seconds:
+                continue
+            if previous[metric] > 0 and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append((key, metric, previous[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rendering and dashboard hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="planets per synthetic catalog")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark, the best one counts")
+    parser.add_argument('--only', nargs='+', help="only run benchmarks whose name contains one of these")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to check the results against")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown / memory growth as a fraction (default: %(default)s)")
+    parser.add_argument('--startup', action='store_true',
+                        help="report the app's import time per module and time to first response instead")
+    args = parser.parse_args()
+
+    if args.startup:
+        print_startup_report()
+        return
+
+    results = run(args.sizes, args.repeat, args.only, args.seed)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for key, metric, before, after in regressions:
+            print(f"REGRESSION {key} {metric}: {before:.6g} -> {after:.6g} ({after / before - 1:+.0%})")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import unicodedata
+from collections import namedtuple
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+
+#Single shared, typed copy of the exoplanet catalog.
+#The CSV is parsed once with an explicit schema and written to a memory-mapped NumPy
+#column store next to it; the frame is read back from that store, so its columns are
+#pages of the mapped files, and later loads reuse it as long as the CSV is unchanged.
+#Every module gets the same frame from get_catalog() and must treat it as read-only.
+#Rows are ordered by S_NAME so each star system is a contiguous slice, which is what
+#StarIndex relies on for constant time lookups.
+#A CatalogWatcher can reload the CSV in the background when it changes; the new frame
+#and index are swapped in together, so callers should ask get_catalog()/get_star_index()
+#per request instead of keeping them, and subscribe() to hear which systems changed.
+
+CATALOG_PATH = "hwc_3d_data.csv"
+CACHE_DIR = ".catalog_cache"
+STORE_VERSION = 3
+# the CSV is parsed this many rows at a time to bound the parser's memory
+CSV_CHUNK_ROWS = 50_000
+
+CATEGORICAL_COLUMNS = ['S_NAME', 'S_TYPE', 'P_DETECTION', 'P_TYPE_TEMP']
+STRING_COLUMNS = ['P_NAME', 'P_DISCOVERY_FACILITY']
+# 0/1 flags, stored as int8 with missing values counted as 0
+FLAG_COLUMNS = ['P_HABZONE_OPT', 'P_HABZONE_CON', 'P_HABITABLE']
+# sky positions keep full precision, everything else fits in float32
+FLOAT64_COLUMNS = ['S_RA', 'S_DEC']
+FLOAT32_COLUMNS = [
+    'S_RADIUS', 'S_TEMPERATURE', 'S_LUMINOSITY', 'S_DISTANCE',
+    'S_HZ_OPT_MAX', 'S_HZ_OPT_MIN', 'S_HZ_CON_MAX', 'S_HZ_CON_MIN', 'S_TIDAL_LOCK', 'S_SNOW_LINE',
+    'P_SEMI_MAJOR_AXIS', 'P_PERIOD', 'P_ECCENTRICITY', 'P_INCLINATION', 'P_YEAR',
+    'P_RADIUS', 'P_MASS', 'P_DENSITY', 'P_TEMP_EQUIL', 'P_TEMP_SURF', 'P_FLUX', 'P_ESI',
+]
+
+SCHEMA = {}
+SCHEMA.update({column: 'category' for column in CATEGORICAL_COLUMNS})
+SCHEMA.update({column: 'string' for column in STRING_COLUMNS})
+SCHEMA.update({column: 'int8' for column in FLAG_COLUMNS})
+SCHEMA.update({column: 'float64' for column in FLOAT64_COLUMNS})
+SCHEMA.update({column: 'float32' for column in FLOAT32_COLUMNS})
+
+STAR_COLUMNS = [column for column in SCHEMA if column.startswith('S_')]
+
+_catalog = None
+_star_index = None
+_catalog_lock = threading.Lock()
+_subscribers = []
+
+logger = logging.getLogger(__name__)
+
+
+def _read_dtype(kind):
+    if kind in ('category', 'string'):
+        return 'object'
+    if kind == 'int8':
+        return 'float32'  # parsed as float so missing flags survive until they are filled
+    return kind
+
+
+#Parsing the CSV with the explicit schema, in chunks of chunksize rows. Columns that
+#appear twice in the file (S_TEMPERATURE does) are only kept once.
+def read_catalog_csv(path, chunksize=CSV_CHUNK_ROWS, **read_csv_kwargs):
+    header = pd.read_csv(path, nrows=0).columns
+    keep = [column for column in header if column in SCHEMA]
+    missing = sorted(set(SCHEMA) - set(keep))
+    if missing:
+        raise ValueError(f"{path} is missing catalog columns: {', '.join(missing)}")
+
+    dtype = {column: _read_dtype(SCHEMA[column]) for column in keep}
+    if not chunksize:
+        return apply_schema(pd.read_csv(path, usecols=keep, dtype=dtype, **read_csv_kwargs))
+    chunks = list(pd.read_csv(path, usecols=keep, dtype=dtype, chunksize=chunksize, **read_csv_kwargs))
+    if not chunks:
+        raise ValueError(f"{path} has no catalog rows")
+    return apply_schema(pd.concat(chunks, ignore_index=True))
+
+
+#Rows without a planet or star name cannot be placed anywhere, and a planet listed twice
+#keeps its last row (later rows in the file are the newer measurements)
+def validate_rows(frame):
+    unnamed = frame['P_NAME'].isna() | frame['S_NAME'].isna()
+    if unnamed.all() and len(frame):
+        raise ValueError("No catalog row has both a planet and a star name")
+    frame = frame[~unnamed]
+    return frame.drop_duplicates('P_NAME', keep='last')
+
+
+def apply_schema(frame):
+    frame = frame[[column for column in SCHEMA if column in frame.columns]]
+    columns = {}
+    for column in frame.columns:
+        kind = SCHEMA[column]
+        if kind == 'category':
+            columns[column] = frame[column].astype('category')
+        elif kind == 'string':
+            columns[column] = frame[column].astype(object)
+        elif kind == 'int8':
+            columns[column] = frame[column].fillna(0).astype('int8')
+        else:
+            columns[column] = frame[column].astype(kind)
+    frame = validate_rows(pd.DataFrame(columns, index=pd.RangeIndex(len(frame))))
+    return frame.sort_values('S_NAME', kind='stable', ignore_index=True)
+
+
+#Values of a float32 column as the float64 numbers they were written as. Widening
+#float32 directly shows its binary noise (1.07 becomes 1.0700000524520874), so values
+#that are displayed or sent as JSON are rounded to the fewest significant digits that
+#still give back the same float32, which is the decimal str(np.float32(v)) prints (this
+#is several times faster than going through strings). Anything that is not float32
+#comes back unchanged.
+def display_values(values):
+    values = np.asarray(values)
+    if values.dtype != np.float32:
+        return values
+    wide = values.astype(np.float64)
+    result = wide.copy()
+    pending = np.isfinite(wide) & (wide != 0)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        exponent = np.floor(np.log10(np.abs(np.where(pending, wide, 1.0))))
+        # nine significant digits always round-trip float32
+        for digits in range(1, 10):
+            rows = np.flatnonzero(pending)
+            if rows.size == 0:
+                break
+            # powers of ten are exact as divisors and multipliers, so the division or
+            # product is the float64 nearest to the decimal
+            shift = digits - 1 - exponent[rows]
+            power = 10.0 ** np.abs(shift)
+            rounded = np.where(shift >= 0, np.round(wide[rows] * power) / power, np.round(wide[rows] / power) * power)
+            done = rounded.astype(np.float32) == values[rows]
+            result[rows[done]] = rounded[done]
+            pending[rows[done]] = False
+    return result
+
+
+#Copy of frame with every float32 column replaced by its display_values
+def display_frame(frame):
+    floats = [column for column, dtype in frame.dtypes.items() if dtype == np.float32]
+    if not floats:
+        return frame
+    return frame.assign(**{column: display_values(frame[column].to_numpy()) for column in floats})
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _store_dir(path, cache_dir):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, name)
+
+
+#Writing every column as a .npy file (category codes plus their labels for categoricals)
+def write_column_store(frame, store_dir, source):
+    os.makedirs(store_dir, exist_ok=True)
+    columns = []
+    for i, column in enumerate(frame.columns):
+        series = frame[column]
+        entry = {'name': column, 'file': f'{i}.npy', 'kind': SCHEMA[column]}
+        if entry['kind'] == 'category':
+            values = series.cat.codes.to_numpy()
+            entry['categories'] = [str(c) for c in series.cat.categories]
+        elif entry['kind'] == 'string':
+            values = series.fillna('').to_numpy(dtype=str)
+        else:
+            values = series.to_numpy()
+        # replaced rather than overwritten, frames still mapping the old file keep working
+        tmp_path = os.path.join(store_dir, f"{entry['file']}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.save(f, values, allow_pickle=False)
+        os.replace(tmp_path, os.path.join(store_dir, entry['file']))
+        columns.append(entry)
+
+    _write_meta(store_dir, {'version': STORE_VERSION, 'source': source, 'rows': len(frame), 'columns': columns})
+
+
+def _write_meta(store_dir, meta):
+    tmp_path = os.path.join(store_dir, f'meta.json.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(store_dir, 'meta.json'))
+
+
+def read_column_store(store_dir):
+    with open(os.path.join(store_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('version') != STORE_VERSION:
+        return None, meta
+
+    columns = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(store_dir, entry['file']), mmap_mode='r', allow_pickle=False)
+        if entry['kind'] == 'category':
+            columns[entry['name']] = pd.Categorical.from_codes(values, categories=entry['categories'])
+        elif entry['kind'] == 'string':
+            values = values.astype(object)
+            values[values == ''] = None
+            columns[entry['name']] = pd.Series(values, dtype=object)
+        else:
+            columns[entry['name']] = values
+    # copy=False keeps every numeric column and the category codes on the mapped files
+    # instead of consolidating them into new blocks, so processes sharing the store
+    # share its pages
+    return pd.DataFrame(columns, index=pd.RangeIndex(meta['rows']), copy=False), meta
+
+
+#Loading the catalog, reusing the column store when the CSV has not changed
+def load_catalog(path=CATALOG_PATH, cache_dir=CACHE_DIR):
+    store_dir = _store_dir(path, cache_dir)
+    source = _source_stamp(path)
+
+    if os.path.exists(os.path.join(store_dir, 'meta.json')):
+        frame, meta = read_column_store(store_dir)
+        if frame is not None:
+            cached = meta['source']
+            if cached['size'] == source['size'] and cached['mtime_ns'] == source['mtime_ns']:
+                return frame
+            # touched but maybe not modified
+            source['sha256'] = file_digest(path)
+            if cached.get('sha256') == source['sha256']:
+                meta['source'] = source
+                _write_meta(store_dir, meta)
+                return frame
+
+    frame = read_catalog_csv(path)
+    source.setdefault('sha256', file_digest(path))
+    try:
+        write_column_store(frame, store_dir, source)
+    except OSError:
+        return frame  # a read-only checkout still works, it just parses the CSV every time
+    # the freshly parsed frame is swapped for the mapped one, like any later load
+    return read_column_store(store_dir)[0]
+
+
+#The shared catalog frame, loaded on first use
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = load_catalog()
+    return _catalog
+
+
+#Lookup key for a star name as it may arrive in a URL: percent-decoded, typographic
+#apostrophes folded to ASCII, whitespace collapsed and case-insensitive,
+#so "teegarden%E2%80%99s%20star" finds "Teegarden's Star"
+def normalize_star_name(name):
+    name = unicodedata.normalize('NFKC', unquote(str(name)))
+    name = name.replace('\u2019', "'").replace('\u2018', "'").replace('`', "'")
+    return ' '.join(name.split()).casefold()
+
+
+StarSystem = namedtuple('StarSystem', ['name', 'start', 'stop', 'info'])
+
+
+#Star name -> contiguous row slice of the catalog plus the star-level columns of that
+#system, built once so route lookups do not scan the frame and the per-system
+#loop in generate_plots does not regroup it.
+class StarIndex:
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.systems = []
+        self._by_name = {}
+        self._row_hashes = None
+        self._digests = None
+
+        names = frame['S_NAME'].to_numpy(dtype=object)
+        if len(names) == 0:
+            return
+        starts = np.concatenate(([0], np.flatnonzero(names[1:] != names[:-1]) + 1))
+        stops = np.concatenate((starts[1:], [len(names)]))
+        star_rows = display_frame(frame[STAR_COLUMNS].iloc[starts])
+
+        for (start, stop), info in zip(zip(starts, stops), star_rows.to_dict('records')):
+            key = normalize_star_name(names[start])
+            if key in self._by_name:
+                raise ValueError(f"Rows of star system {names[start]!r} are not contiguous")
+            system = StarSystem(str(names[start]), int(start), int(stop), info)
+            self.systems.append(system)
+            self._by_name[key] = system
+
+    def __len__(self):
+        return len(self.systems)
+
+    def __contains__(self, name):
+        return normalize_star_name(name) in self._by_name
+
+    def lookup(self, name):
+        return self._by_name.get(normalize_star_name(name))
+
+    def rows(self, system):
+        return self.frame.iloc[system.start:system.stop]
+
+    #(name, rows) pairs in the same order as df.groupby('S_NAME')
+    def partitions(self):
+        for system in self.systems:
+            yield system.name, self.rows(system)
+
+    #pandas' row hashes of the frame (of one system's rows when given). The whole frame
+    #is hashed once; a row's hash does not depend on the other rows, so the slice is the
+    #same as hashing the system's rows on their own.
+    def row_hashes(self, system=None):
+        if self._row_hashes is None:
+            self._row_hashes = pd.util.hash_pandas_object(self.frame, index=False).to_numpy()
+        if system is None:
+            return self._row_hashes
+        return self._row_hashes[system.start:system.stop]
+
+    #Digest of every system's rows by name, computed once per index
+    def digests(self):
+        if self._digests is None:
+            self._digests = {system.name: hashlib.sha1(self.row_hashes(system).tobytes()).hexdigest()
+                             for system in self.systems}
+        return self._digests
+
+
+def get_star_index():
+    global _catalog, _star_index
+    if _star_index is None:
+        with _catalog_lock:
+            if _star_index is None:
+                # built from whatever frame is current once the lock is held, so it
+                # can never pair with a frame that a reload has already replaced
+                frame = _catalog if _catalog is not None else load_catalog()
+                _catalog = frame
+                _star_index = StarIndex(frame)
+    return _star_index
+
+
+#Registering callback(changed, frame, star_index), called after every reload that
+#changed something with the set of star system names whose rows were added, removed
+#or modified, and the new frame and index
+def subscribe(callback):
+    _subscribers.append(callback)
+    return callback
+
+
+def system_digests(star_index):
+    return star_index.digests()
+
+
+#Names of the systems that differ between two indexes
+def changed_systems(old_index, new_index):
+    old, new = system_digests(old_index), system_digests(new_index)
+    return {name for name in old.keys() | new.keys() if old.get(name) != new.get(name)}
+
+
+#Row ids of the rows in new_index's frame that old_index's frame does not have, or None
+#unless the new catalog only adds rows (every old row is still there, unchanged). Rows
+#are compared by their hashes, which both indexes have from changed_systems already.
+def appended_rows(old_index, new_index):
+    old, new = old_index.row_hashes(), new_index.row_hashes()
+    added = ~np.isin(new, old)
+    if len(new) - np.count_nonzero(added) != len(old):
+        return None
+    return np.flatnonzero(added)
+
+
+#Re-reading the catalog and swapping it in if any system changed. Parsing and
+#indexing happen before the swap, so requests keep using the old data until the new
+#frame and its index replace it together. Returns the changed system names.
+def reload_catalog(path=CATALOG_PATH, cache_dir=CACHE_DIR):
+    global _catalog, _star_index
+    frame = load_catalog(path, cache_dir)
+    star_index = StarIndex(frame)
+    old_index = get_star_index()
+    changed = changed_systems(old_index, star_index)
+    if not changed:
+        return changed
+
+    with _catalog_lock:
+        _catalog = frame
+        _star_index = star_index
+    for callback in list(_subscribers):
+        try:
+            callback(changed, frame, star_index)
+        except Exception:
+            logger.exception("Catalog reload subscriber %r failed", callback)
+    return changed
+
+
+#Background thread polling the CSV's size and modification time every interval
+#seconds. A change is only picked up once the file has stopped changing for one
+#interval, so a copy still being written is not parsed half way through. A file
+#that fails to parse or validate is logged and the current catalog stays in place.
+class CatalogWatcher(threading.Thread):
+
+    def __init__(self, path=CATALOG_PATH, interval=2.0, cache_dir=CACHE_DIR):
+        super().__init__(name='catalog-watcher', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.cache_dir = cache_dir
+        self._stop_event = threading.Event()
+
+    def _stamp(self):
+        try:
+            return _source_stamp(self.path)
+        except FileNotFoundError:
+            return None
+
+    def run(self):
+        loaded = self._stamp()
+        pending = None
+        while not self._stop_event.wait(self.interval):
+            stamp = self._stamp()
+            if stamp is None or stamp == loaded:
+                pending = None
+                continue
+            if stamp != pending:
+                pending = stamp  # changed since the last poll, wait for it to settle
+                continue
+            try:
+                changed = reload_catalog(self.path, self.cache_dir)
+            except (OSError, ValueError, pd.errors.ParserError):
+                logger.exception("Reloading %s failed, keeping the current catalog", self.path)
+            else:
+                if changed:
+                    logger.info("Reloaded %s, %d star system(s) changed", self.path, len(changed))
+            loaded, pending = stamp, None
+
+    def stop(self):
+        self._stop_event.set()
+
+
+_watcher = None
+
+
+def start_watcher(interval=2.0, path=CATALOG_PATH):
+    global _watcher
+    with _catalog_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = CatalogWatcher(path, interval)
+            _watcher.start()
+        return _watcher
+
+
+#Stopping the watcher and waiting for a reload in progress to finish (before a fork,
+#so no child starts with the catalog lock held)
+def stop_watcher(timeout=None):
+    global _watcher
+    with _catalog_lock:
+        watcher, _watcher = _watcher, None
+    if watcher is not None:
+        watcher.stop()
+        watcher.join(timeout)
@@ -0,0 +1,10 @@
+import pytest
+
+from benchmark import synthetic_catalog
+
+
+#Seeded synthetic catalogs with the schema of hwc_3d_data.csv (see benchmark.py): a
+#tiny one and one with a few hundred systems
+@pytest.fixture(scope='session', params=[10, 1000])
+def frame(request):
+    return synthetic_catalog(request.param, seed=0)
@@ -0,0 +1,106 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+#Pearson correlation from running sufficient statistics.
+#For every pair of columns it keeps the number of rows where both are present and the
+#sums, sums of squares and cross-products over exactly those rows, so the matrix matches
+#DataFrame.corr() (pairwise NaN handling) and new rows are folded in without rescanning
+#the old ones. Values are shifted by the first batch's column means before summing to
+#keep the sums of squares from cancelling out.
+class StreamingCorrelation:
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.shift = None
+        self.rows = 0
+        self.count = np.zeros((k, k))
+        # sums[i, j]: sum of column i over the rows where column j is present too
+        self.sums = np.zeros((k, k))
+        self.squares = np.zeros((k, k))
+        self.products = np.zeros((k, k))
+        self._lock = threading.Lock()
+
+    def _values(self, frame):
+        values = np.empty((len(frame), len(self.columns)))
+        for i, column in enumerate(self.columns):
+            values[:, i] = np.asarray(frame[column], dtype=np.float64)
+        return values
+
+    #Folding in new rows, O(rows * columns^2)
+    def update(self, frame):
+        values = self._values(frame)
+        present = np.isfinite(values)
+        with self._lock:
+            if self.shift is None:
+                counts = present.sum(axis=0)
+                totals = np.where(present, values, 0).sum(axis=0)
+                self.shift = np.divide(totals, counts, out=np.zeros(len(self.columns)), where=counts > 0)
+            shifted = np.where(present, values - self.shift, 0)
+            mask = present.astype(np.float64)
+            self.count += mask.T @ mask
+            self.sums += shifted.T @ mask
+            self.squares += (shifted ** 2).T @ mask
+            self.products += shifted.T @ shifted
+            self.rows += len(values)
+        return self
+
+    def matrix(self):
+        with self._lock:
+            n, s, ss, p = self.count, self.sums, self.squares, self.products
+            with np.errstate(invalid='ignore', divide='ignore'):
+                covariance = n * p - s * s.T
+                variance = n * ss - s ** 2
+                r = covariance / np.sqrt(variance * variance.T)
+            # fewer than two shared rows or a constant column has no correlation
+            r[(n < 2) | ~np.isfinite(r)] = np.nan
+            r = np.clip(r, -1, 1)
+            np.fill_diagonal(r, np.where(np.diag(variance) > 0, 1.0, np.nan))
+        return pd.DataFrame(r, index=self.columns, columns=self.columns)
+
+    @classmethod
+    def from_frame(cls, frame, columns):
+        return cls(columns).update(frame)
+
+    def copy(self):
+        other = StreamingCorrelation(self.columns)
+        with self._lock:
+            other.shift = self.shift
+            other.rows = self.rows
+            other.count, other.sums = self.count.copy(), self.sums.copy()
+            other.squares, other.products = self.squares.copy(), self.products.copy()
+        return other
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+#One accumulator per (frame, columns), built on first use and shared by every consumer
+#of that frame, so the full scan happens once per catalog load
+def shared_correlation(frame, columns):
+    key = tuple(columns)
+    with _shared_lock:
+        entry = _shared.get(key)
+        if entry is not None and entry[0] is frame:
+            return entry[1]
+    stats = StreamingCorrelation.from_frame(frame, columns)
+    with _shared_lock:
+        _shared[key] = (frame, stats)
+    return stats
+
+
+#Moving the accumulators of old_frame over to frame, which is old_frame plus the rows
+#of added: only those rows are folded in, into copies, so anyone still reading
+#old_frame's matrix keeps consistent sums
+def carry_over(old_frame, frame, added):
+    with _shared_lock:
+        entries = [(key, stats) for key, (source, stats) in _shared.items() if source is old_frame]
+    for key, stats in entries:
+        stats = stats.copy().update(added)
+        with _shared_lock:
+            if _shared.get(key, (None,))[0] is old_frame:
+                _shared[key] = (frame, stats)
@@ -1,21 +1,440 @@
+import json
+import threading
+
 import dash
+import numpy as np
+import pandas as pd
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output
+from dash.exceptions import PreventUpdate
 import plotly.express as px
 import plotly.graph_objects as go  # Import for advanced trace additions
-import pandas as pd
-
-# Load the dataset
-df = pd.read_csv("hwc_3d_data.csv")
+import plotly.io as pio
+from catalog import appended_rows, get_star_index, subscribe
+from correlation import carry_over, shared_correlation
+from fast_figure import default_template, typed_array
+from instrumentation import stage
+
+
+# above this many planets the charts are aggregated on the server instead of drawing one
+# mark per planet, so figure size stops growing with the catalog
+LARGE_CATALOG_ROWS = 5000
+# points kept (a fixed random sample) in the scatters that stay point clouds
+LARGE_SCATTER_POINTS = 5000
+HISTOGRAM_BINS = 50
+DENSITY_BINS = 60
+
+
+#Dashboard dataset: the shared catalog with P_HABITABLE as a category, built once per
+#catalog load instead of on every callback
+def prepare_dataset(frame):
+    return frame.assign(P_HABITABLE=frame['P_HABITABLE'].astype('category'))
+
+
+#Figure builders, one per chart (plus the column payload for mode='client'), taking the
+#prepared dataset and the dropdown value. They return None for an option they do not know,
+#and hand catalogs above LARGE_CATALOG_ROWS to the large_* versions further down.
+def habitability_bar(df, _=None):
+    if is_large(df):
+        return large_habitability_bar(df)
+    # Bar chart for habitability index
+    bar_chart = px.bar(
+        df,
+        x='P_NAME',
+        y='P_HABITABLE',
+        title="Habitability Index of Exoplanets",
+        color='P_HABITABLE',
+        color_discrete_sequence=['orange', 'skyblue'],  # Blue and red palette
+        labels={'P_NAME': 'Planet Name', 'P_HABITABLE': 'Habitability Index'},
+        category_orders={"P_HABITABLE": [0, 1]}
+    )
+    bar_chart.update_yaxes(tickvals=[0, 1])
+    bar_chart.update_traces(marker=dict(line=dict(width=2, color='black')))
+    return bar_chart
+
+
+def habitability_scatter(df, selected_factor):
+    if selected_factor not in ('S_DISTANCE', 'P_RADIUS', 'P_MASS'):
+        return None
+    render_mode = 'auto'
+    if is_large(df):
+        df, render_mode = sample_rows(df), 'webgl'
+    # Scatter plot of selected factor vs. habitability index
+    scatter_plot = px.scatter(
+        df,
+        x=selected_factor,
+        y='P_HABITABLE',
+        hover_name='P_NAME',
+        title=f"{selected_factor.replace('_', ' ')} vs. Habitability Index",
+        color='P_HABITABLE',  # Color by habitability
+        color_continuous_scale='Viridis',  # Color scale
+        labels={selected_factor: selected_factor.replace('_', ' '), 'P_HABITABLE': 'Habitability Index'},
+        category_orders={"P_HABITABLE": [0, 1]},
+        render_mode=render_mode
+    )
+    scatter_plot.update_yaxes(tickvals=[0, 1])
+    return scatter_plot
+
+
+def additional_scatter(df, selected_scatter):
+    if is_large(df) and selected_scatter in DENSITY_PLOTS:
+        return density_plot(df, *DENSITY_PLOTS[selected_scatter])
+    if selected_scatter == 'mass_radius':
+        return px.scatter(df, x="P_MASS", y="P_RADIUS", hover_name='P_NAME', title="Mass vs Radius", color='P_HABITABLE', color_continuous_scale='Viridis')
+    elif selected_scatter == 'temp_semi_major':
+        return px.scatter(df, x="P_SEMI_MAJOR_AXIS", y="P_TEMP_EQUIL", hover_name='P_NAME', title="Equilibrium Temperature vs Semi-Major Axis", color='P_HABITABLE', color_continuous_scale='Viridis')
+    elif selected_scatter == 'esi_habitability':
+        if is_large(df):
+            return px.scatter(sample_rows(df), x="P_ESI", y="P_HABITABLE", hover_name='P_NAME', title="Earth Similarity Index vs Habitability", color='P_HABITABLE', color_continuous_scale='Viridis', render_mode='webgl')
+        return px.scatter(df, x="P_ESI", y="P_HABITABLE", hover_name='P_NAME', title="Earth Similarity Index vs Habitability", color='P_HABITABLE', color_continuous_scale='Viridis')
+    return None
+
+
+def histogram(df, selected_histogram):
+    if is_large(df):
+        return large_histogram(df, selected_histogram)
+    if selected_histogram == 'P_PERIOD':
+        return px.histogram(df, x="P_PERIOD", hover_name='P_NAME', title="Distribution of Orbital Periods", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
+    elif selected_histogram == 'P_TYPE_TEMP':
+        return px.histogram(df, x="P_TYPE_TEMP", hover_name='P_NAME', title="Distribution of Planetary Types", color='P_TYPE_TEMP', color_discrete_sequence=['red', 'skyblue', 'orange'])
+    return None
+
+
+def boxplot(df, selected_boxplot):
+    if is_large(df):
+        return large_boxplot(df, selected_boxplot)
+    if selected_boxplot == 'mass_radius_type':
+        fig = px.box(df, x="P_TYPE_TEMP", y="P_MASS", hover_name='P_NAME', title="Mass by Planet Type", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
+        fig.add_trace(go.Box(x=df["P_TYPE_TEMP"], y=df["P_RADIUS"], name="Radius", marker=dict(color='lightgreen')))
+        return fig
+    elif selected_boxplot == 'temp_habitability':
+        return px.box(df, x="P_HABITABLE", y="P_TEMP_EQUIL", hover_name='P_NAME', title="Equilibrium Temperature by Habitability", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
+    return None
+
+
+def barchart(df, selected_barchart):
+    if is_large(df) and selected_barchart == 'stellar_type':
+        return large_stellar_type_bar(df)
+    if selected_barchart == 'stellar_type':
+        return px.bar(df, x="S_TYPE", hover_name='P_NAME', title="Number of Exoplanets per Stellar Type", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
+    elif selected_barchart == 'habitability_count':
+        # value_counts().reset_index() names its columns after the values and 'count'
+        habitability_counts = df['P_HABITABLE'].value_counts().reset_index()
+        return px.bar(habitability_counts, x='P_HABITABLE', y='count', title="Count of Habitable vs Non-Habitable Planets", color='P_HABITABLE', color_discrete_map={0: '#FF5733', 1: '#28A745'})
+    return None
+
+
+def heatmap(df, _=None):
+    # Correlation heatmap
+    correlation_columns = ["P_MASS", "P_RADIUS", "P_TEMP_EQUIL", "P_ESI", "P_HABITABLE"]
+    correlation_df = shared_correlation(df, correlation_columns).matrix()
+    return px.imshow(correlation_df, text_auto=True, title="Correlation Heatmap", color_continuous_scale='Viridis')
+
+
+def is_large(df):
+    return len(df) > LARGE_CATALOG_ROWS
+
+
+def sample_rows(df, limit=LARGE_SCATTER_POINTS):
+    if len(df) <= limit:
+        return df
+    rows = np.sort(np.random.default_rng(0).choice(len(df), limit, replace=False))
+    return df.iloc[rows]
+
+
+#(value, row mask) per habitability class, in the order the charts color them
+def habitability_groups(df):
+    habitable = df['P_HABITABLE']
+    for value in habitable.cat.categories:
+        mask = (habitable == value).to_numpy()
+        if mask.any():
+            yield value, mask
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=float)
+    return values[np.isfinite(values)]
+
+
+#Bin edges over the finite values, log-spaced when they are all positive and span
+#more than two decades (masses, radii, distances and periods usually do)
+def bin_edges(values, bins):
+    values = _finite(values)
+    if values.size == 0:
+        return np.linspace(0, 1, bins + 1), False
+    low, high = values.min(), values.max()
+    if low > 0 and high / low > 100:
+        return np.geomspace(low, high, bins + 1), True
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1), False
+
+
+def large_habitability_bar(df):
+    fig = go.Figure()
+    colors = ['orange', 'skyblue']
+    for i, (value, mask) in enumerate(habitability_groups(df)):
+        fig.add_trace(go.Bar(x=[value], y=[int(mask.sum())], name=str(value), marker=dict(color=colors[i % 2], line=dict(width=2, color='black'))))
+    fig.update_layout(title=f"Habitability Index of Exoplanets ({len(df)} planets)", xaxis_title='Habitability Index', yaxis_title='Number of planets', legend_title_text='Habitability Index')
+    fig.update_xaxes(tickvals=[0, 1])
+    return fig
+
+
+#Mass vs Radius and Temperature vs Semi-Major Axis as 2-D density grids
+DENSITY_PLOTS = {
+    'mass_radius': ('P_MASS', 'P_RADIUS', "Mass vs Radius"),
+    'temp_semi_major': ('P_SEMI_MAJOR_AXIS', 'P_TEMP_EQUIL', "Equilibrium Temperature vs Semi-Major Axis"),
+}
+
+
+def density_plot(df, x, y, title):
+    x_values = df[x].to_numpy(dtype=float)
+    y_values = df[y].to_numpy(dtype=float)
+    finite = np.isfinite(x_values) & np.isfinite(y_values)
+    x_edges, x_log = bin_edges(x_values[finite], DENSITY_BINS)
+    y_edges, y_log = bin_edges(y_values[finite], DENSITY_BINS)
+    counts, _, _ = np.histogram2d(x_values[finite], y_values[finite], bins=[x_edges, y_edges])
+    # empty cells stay transparent
+    z = np.where(counts > 0, counts, np.nan).T
+    x_centers = np.sqrt(x_edges[:-1] * x_edges[1:]) if x_log else (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = np.sqrt(y_edges[:-1] * y_edges[1:]) if y_log else (y_edges[:-1] + y_edges[1:]) / 2
+    fig = go.Figure(go.Heatmap(x=x_centers, y=y_centers, z=z, colorscale='Viridis', colorbar=dict(title='Planets'),
+                               hovertemplate=f'{x}=%{{x:.3g}}<br>{y}=%{{y:.3g}}<br>planets=%{{z}}<extra></extra>'))
+    fig.update_layout(title=f"{title} ({int(finite.sum())} planets)", xaxis_title=x, yaxis_title=y)
+    fig.update_xaxes(type='log' if x_log else 'linear')
+    fig.update_yaxes(type='log' if y_log else 'linear')
+    return fig
+
+
+def large_histogram(df, selected_histogram):
+    if selected_histogram == 'P_PERIOD':
+        periods = df['P_PERIOD'].to_numpy(dtype=float)
+        edges, log = bin_edges(periods, HISTOGRAM_BINS)
+        centers = np.sqrt(edges[:-1] * edges[1:]) if log else (edges[:-1] + edges[1:]) / 2
+        fig = go.Figure()
+        colors = ['orange', 'skyblue']
+        for i, (value, mask) in enumerate(habitability_groups(df)):
+            counts, _ = np.histogram(_finite(periods[mask]), bins=edges)
+            fig.add_trace(go.Bar(x=centers, y=counts, width=np.diff(edges), name=str(value), marker=dict(color=colors[i % 2]),
+                                 hovertemplate=f'P_HABITABLE={value}<br>P_PERIOD=%{{x:.3g}}<br>count=%{{y}}<extra></extra>'))
+        fig.update_layout(title="Distribution of Orbital Periods", xaxis_title='P_PERIOD', yaxis_title='count', legend_title_text='P_HABITABLE', barmode='relative', bargap=0)
+        fig.update_xaxes(type='log' if log else 'linear')
+        return fig
+    elif selected_histogram == 'P_TYPE_TEMP':
+        counts = df['P_TYPE_TEMP'].value_counts(sort=False)
+        counts = counts[counts > 0]
+        colors = ['red', 'skyblue', 'orange']
+        fig = go.Figure([go.Bar(x=[label], y=[int(count)], name=str(label), marker=dict(color=colors[i % 3]))
+                         for i, (label, count) in enumerate(counts.items())])
+        fig.update_layout(title="Distribution of Planetary Types", xaxis_title='P_TYPE_TEMP', yaxis_title='count', legend_title_text='P_TYPE_TEMP')
+        return fig
+    return None
+
+
+#Quartiles and Tukey fences of each group, so a box costs five numbers instead of
+#every data point
+def box_stats(values):
+    values = _finite(values)
+    if values.size == 0:
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lower = values[values >= q1 - 1.5 * iqr].min()
+    upper = values[values <= q3 + 1.5 * iqr].max()
+    return q1, median, q3, lower, upper
+
+
+def _precomputed_box(x, values_per_x, **props):
+    stats = [(label, box_stats(values)) for label, values in zip(x, values_per_x)]
+    stats = [(label, s) for label, s in stats if s is not None]
+    return go.Box(x=[label for label, _ in stats], q1=[s[0] for _, s in stats], median=[s[1] for _, s in stats],
+                  q3=[s[2] for _, s in stats], lowerfence=[s[3] for _, s in stats], upperfence=[s[4] for _, s in stats],
+                  **props)
+
+
+def large_boxplot(df, selected_boxplot):
+    colors = ['orange', 'skyblue']
+    fig = go.Figure()
+    if selected_boxplot == 'mass_radius_type':
+        types = [t for t in df['P_TYPE_TEMP'].cat.categories if (df['P_TYPE_TEMP'] == t).any()]
+        type_values = df['P_TYPE_TEMP'].to_numpy(dtype=object)
+        mass = df['P_MASS'].to_numpy(dtype=float)
+        for i, (value, mask) in enumerate(habitability_groups(df)):
+            fig.add_trace(_precomputed_box(types, [mass[mask & (type_values == t)] for t in types], name=str(value),
+                                           offsetgroup=str(value), marker=dict(color=colors[i % 2])))
+        radius = df['P_RADIUS'].to_numpy(dtype=float)
+        fig.add_trace(_precomputed_box(types, [radius[type_values == t] for t in types], name="Radius", marker=dict(color='lightgreen')))
+        fig.update_layout(title="Mass by Planet Type", xaxis_title='P_TYPE_TEMP', yaxis_title='P_MASS', legend_title_text='P_HABITABLE', boxmode='group')
+        return fig
+    elif selected_boxplot == 'temp_habitability':
+        temperature = df['P_TEMP_EQUIL'].to_numpy(dtype=float)
+        for i, (value, mask) in enumerate(habitability_groups(df)):
+            fig.add_trace(_precomputed_box([value], [temperature[mask]], name=str(value), marker=dict(color=colors[i % 2])))
+        fig.update_layout(title="Equilibrium Temperature by Habitability", xaxis_title='P_HABITABLE', yaxis_title='P_TEMP_EQUIL', legend_title_text='P_HABITABLE')
+        return fig
+    return None
+
+
+def large_stellar_type_bar(df):
+    counts = pd.crosstab(df['S_TYPE'], df['P_HABITABLE'])
+    colors = ['orange', 'skyblue']
+    fig = go.Figure()
+    for i, value in enumerate(counts.columns):
+        column = counts[value]
+        column = column[column > 0]
+        fig.add_trace(go.Bar(x=column.index.astype(str), y=column.to_numpy(), name=str(value), marker=dict(color=colors[i % 2])))
+    fig.update_layout(title="Number of Exoplanets per Stellar Type", xaxis_title='S_TYPE', yaxis_title='count', legend_title_text='P_HABITABLE', barmode='relative')
+    return fig
+
+
+#Columns the client-side charts need, in compact form: numbers as base64 float32,
+#categoricals as int16 codes plus their labels, planet names as a plain list.
+#Large catalogs get the (bounded) server-side figures for every dropdown value instead.
+CLIENT_COLUMNS = ['P_NAME', 'P_HABITABLE', 'S_DISTANCE', 'P_RADIUS', 'P_MASS', 'P_SEMI_MAJOR_AXIS',
+                  'P_TEMP_EQUIL', 'P_ESI', 'P_PERIOD', 'P_TYPE_TEMP', 'S_TYPE']
+CLIENT_OPTIONS = {
+    'habitability_scatter': ['S_DISTANCE', 'P_RADIUS', 'P_MASS'],
+    'additional_scatter': ['mass_radius', 'temp_semi_major', 'esi_habitability'],
+    'histogram': ['P_PERIOD', 'P_TYPE_TEMP'],
+    'boxplot': ['mass_radius_type', 'temp_habitability'],
+    'barchart': ['stellar_type', 'habitability_count'],
+}
+
+
+def client_dataset(df, _=None):
+    if is_large(df):
+        figures = {chart: {option: json.loads(pio.to_json(FIGURE_BUILDERS[chart](df, option), validate=False))
+                           for option in options}
+                   for chart, options in CLIENT_OPTIONS.items()}
+        return {'rows': len(df), 'figures': figures}
+
+    columns = {}
+    for column in CLIENT_COLUMNS:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            columns[column] = {'categories': series.cat.categories.tolist(),
+                               'codes': typed_array(series.cat.codes.to_numpy(), np.int16)}
+        elif series.dtype == object:
+            columns[column] = series.tolist()
+        else:
+            columns[column] = typed_array(series.to_numpy(), np.float32)
+    # the template plotly express would apply, sent once instead of with every figure
+    return {'rows': len(df), 'columns': columns, 'template': default_template(), 'options': CLIENT_OPTIONS}
+
+
+FIGURE_BUILDERS = {
+    'habitability_bar': habitability_bar,
+    'habitability_scatter': habitability_scatter,
+    'additional_scatter': additional_scatter,
+    'histogram': histogram,
+    'boxplot': boxplot,
+    'barchart': barchart,
+    'heatmap': heatmap,
+    'client_dataset': client_dataset,
+}
+
+
+#Serialized dashboard figures keyed by (chart, dropdown value).
+#Each figure is built once against the prepared dataset and kept as JSON text, so
+#nothing shared is ever handed to a callback to mutate; every call gets its own copy.
+#The store is tied to the star index (and catalog frame) it was built from and starts
+#over when get_star_index() returns a different one.
+class FigureStore:
+
+    def __init__(self, builders=FIGURE_BUILDERS, load=get_star_index):
+        self.builders = builders
+        self.load = load
+        self._lock = threading.Lock()
+        self._star_index = None
+        self._frame = None
+        self._dataset = None
+        self._figures = {}
+
+    def _current(self):
+        star_index = self.load()
+        with self._lock:
+            if star_index is not self._star_index:
+                self._dataset = prepare_dataset(star_index.frame)
+                self._figures = {}
+                self._frame = star_index.frame
+                self._star_index = star_index
+            return self._frame, self._dataset, self._figures
+
+    def get(self, chart, option=None):
+        frame, dataset, figures = self._current()
+        key = (chart, option)
+        text = figures.get(key)
+        if text is None:
+            with stage(f'dash_{chart}'):
+                fig = self.builders[chart](dataset, option)
+            if fig is None:
+                raise PreventUpdate
+            text = pio.to_json(fig, validate=False)
+            # a figure built against a dataset that was swapped out meanwhile is not kept
+            with self._lock:
+                if self._frame is frame:
+                    text = self._figures.setdefault(key, text)
+        return json.loads(text)
+
+    def invalidate(self):
+        with self._lock:
+            self._star_index = None
+            self._frame = None
+            self._dataset = None
+            self._figures = {}
+
+    #Starting over for star_index after a reload. When the reload only appended rows the
+    #new dataset is prepared right away and the running sums behind it (the correlation
+    #heatmap) fold in just the added rows instead of rescanning the catalog.
+    def reload(self, star_index):
+        with self._lock:
+            old_index, old_dataset = self._star_index, self._dataset
+        self.invalidate()
+        if old_index is None:
+            return
+        added = appended_rows(old_index, star_index)
+        if added is None:
+            return
+        dataset = prepare_dataset(star_index.frame)
+        carry_over(old_dataset, dataset, dataset.iloc[added])
+        with self._lock:
+            # unless a request or another reload got here first
+            if self._star_index is None:
+                self._star_index, self._frame, self._dataset = star_index, star_index.frame, dataset
+
+
+figure_store = FigureStore()
+
+
+# every dashboard chart aggregates the whole catalog, so any reload affects all of them
+@subscribe
+def on_catalog_reload(changed, frame, star_index):
+    figure_store.reload(star_index)
+
+
+#mode='server' answers every dropdown change with a callback on the server;
+#mode='client' sends the prepared columns once in a dcc.Store and draws the charts
+#in the browser with the clientside callbacks in assets/dashboard.js
+DASHBOARD_MODES = ('server', 'client')
 
 
 # Initialize the Dash app
-def create_dash_app(flask_app):
+def create_dash_app(flask_app, mode='server'):
+    if mode not in DASHBOARD_MODES:
+        raise ValueError(f"mode must be one of {DASHBOARD_MODES}, got {mode!r}")
     dash_app = dash.Dash(__name__, server=flask_app, url_base_pathname='/dashboard/')
+    client = mode == 'client'
+
+    # charts without a dropdown of their own come with the page in client mode
+    def graph(graph_id, chart=None):
+        if client and chart is not None:
+            return dcc.Graph(id=graph_id, figure=figure_store.get(chart))
+        return dcc.Graph(id=graph_id)
 
     #px.defaults.layout.template = "plotly_dark"
     # Define the layout of the Dash app
-    dash_app.layout = html.Div([
+    def layout_children():
+        return [
         html.H1("Exoplanet Habitability Dashboard"),
 
             html.H3("How to Interpret the Charts"),
@@ -45,7 +464,7 @@ def create_dash_app(flask_app):
         ),
 
         # Habitability Index Bar Chart
-        dcc.Graph(id='habitability-bar-chart'),
+        graph('habitability-bar-chart', 'habitability_bar'),
 
         # Scatter plot for selected factor vs. Habitability Index
             html.H4("2. Scatter Plot (Factor vs Habitability Index)"),
@@ -132,114 +551,76 @@ def create_dash_app(flask_app):
                 "You can also see if habitability is strongly correlated with specific factors, which might indicate that these factors are important for determining habitability."),
 
         html.Label("Correlation Heatmap:"),
-        dcc.Graph(id='heatmap')
-    ])
-
-    # Dash callbacks for charts
+        graph('heatmap', 'heatmap')
+    ]
+
+    # built per page load so the page always carries the current catalog
+    def serve_layout():
+        children = layout_children()
+        if client:
+            children.append(dcc.Store(id='dashboard-data', data=figure_store.get('client_dataset')))
+        return html.Div(children)
+
+    dash_app.layout = serve_layout
+
+    if client:
+        for output, inp, function_name in [
+            ('habitability-scatter-plot', 'factor-dropdown', 'habitabilityScatter'),
+            ('additional-scatter-plot', 'scatter-dropdown', 'additionalScatter'),
+            ('histogram', 'histogram-dropdown', 'histogram'),
+            ('boxplot', 'boxplot-dropdown', 'boxplot'),
+            ('barchart', 'barchart-dropdown', 'barchart'),
+        ]:
+            dash_app.clientside_callback(
+                ClientsideFunction(namespace='exoplanets', function_name=function_name),
+                Output(output, 'figure'),
+                [Input(inp, 'value'), Input('dashboard-data', 'data')]
+            )
+        return dash_app
+
+    # Dash callbacks for charts, all served from the precomputed figure store
     @dash_app.callback(
         [Output('habitability-bar-chart', 'figure'),
          Output('habitability-scatter-plot', 'figure')],
         [Input('factor-dropdown', 'value')]
     )
     def update_habitability_charts(selected_factor):
-        df['P_HABITABLE'] = df['P_HABITABLE'].astype('category')
-
-        # Bar chart for habitability index
-        bar_chart = px.bar(
-            df,
-            x='P_NAME',
-            y='P_HABITABLE',
-            title="Habitability Index of Exoplanets",
-            color='P_HABITABLE',
-            color_discrete_sequence=['orange', 'skyblue'],  # Blue and red palette
-            labels={'P_NAME': 'Planet Name', 'P_HABITABLE': 'Habitability Index'},
-            category_orders={"P_HABITABLE": [0, 1]}
-        )
-        bar_chart.update_yaxes(tickvals=[0, 1])
-        bar_chart.update_traces(marker=dict(line=dict(width=2, color='black')))
-
-        # Scatter plot of selected factor vs. habitability index
-        scatter_plot = px.scatter(
-            df,
-            x=selected_factor,
-            y='P_HABITABLE',
-            hover_name='P_NAME',
-            title=f"{selected_factor.replace('_', ' ')} vs. Habitability Index",
-            color='P_HABITABLE',  # Color by habitability
-            color_continuous_scale='Viridis',  # Color scale
-            labels={selected_factor: selected_factor.replace('_', ' '), 'P_HABITABLE': 'Habitability Index'},
-            category_orders={"P_HABITABLE": [0, 1]}
-        )
-        scatter_plot.update_yaxes(tickvals=[0, 1])
-        return bar_chart, scatter_plot
+        # the bar chart does not depend on the factor, so it is stored once
+        return figure_store.get('habitability_bar'), figure_store.get('habitability_scatter', selected_factor)
 
     @dash_app.callback(
         Output('additional-scatter-plot', 'figure'),
         [Input('scatter-dropdown', 'value')]
     )
     def update_additional_scatter(selected_scatter):
-        df['P_HABITABLE'] = df['P_HABITABLE'].astype('category')
-
-        if selected_scatter == 'mass_radius':
-            fig = px.scatter(df, x="P_MASS", y="P_RADIUS", hover_name='P_NAME', title="Mass vs Radius", color='P_HABITABLE', color_continuous_scale='Viridis')
-        elif selected_scatter == 'temp_semi_major':
-            fig = px.scatter(df, x="P_SEMI_MAJOR_AXIS", y="P_TEMP_EQUIL", hover_name='P_NAME', title="Equilibrium Temperature vs Semi-Major Axis", color='P_HABITABLE', color_continuous_scale='Viridis')
-        elif selected_scatter == 'esi_habitability':
-            fig = px.scatter(df, x="P_ESI", y="P_HABITABLE", hover_name='P_NAME', title="Earth Similarity Index vs Habitability", color='P_HABITABLE', color_continuous_scale='Viridis')
-        return fig
+        return figure_store.get('additional_scatter', selected_scatter)
 
     @dash_app.callback(
         Output('histogram', 'figure'),
         [Input('histogram-dropdown', 'value')]
     )
     def update_histogram(selected_histogram):
-        df['P_HABITABLE'] = df['P_HABITABLE'].astype('category')
-
-        if selected_histogram == 'P_PERIOD':
-            fig = px.histogram(df, x="P_PERIOD", hover_name='P_NAME', title="Distribution of Orbital Periods", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
-        elif selected_histogram == 'P_TYPE_TEMP':
-            fig = px.histogram(df, x="P_TYPE_TEMP", hover_name='P_NAME', title="Distribution of Planetary Types", color='P_TYPE_TEMP', color_discrete_sequence=['red', 'skyblue', 'orange'])
-        return fig
+        return figure_store.get('histogram', selected_histogram)
 
     @dash_app.callback(
         Output('boxplot', 'figure'),
         [Input('boxplot-dropdown', 'value')]
     )
     def update_boxplot(selected_boxplot):
-        df['P_HABITABLE'] = df['P_HABITABLE'].astype('category')
-
-        if selected_boxplot == 'mass_radius_type':
-            fig = px.box(df, x="P_TYPE_TEMP", y="P_MASS", hover_name='P_NAME', title="Mass by Planet Type", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
-            fig.add_trace(go.Box(x=df["P_TYPE_TEMP"], y=df["P_RADIUS"], name="Radius", marker=dict(color='lightgreen')))
-        elif selected_boxplot == 'temp_habitability':
-            fig = px.box(df, x="P_HABITABLE", y="P_TEMP_EQUIL", hover_name='P_NAME', title="Equilibrium Temperature by Habitability", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
-        return fig
+        return figure_store.get('boxplot', selected_boxplot)
 
     @dash_app.callback(
         Output('barchart', 'figure'),
         [Input('barchart-dropdown', 'value')]
     )
     def update_barchart(selected_barchart):
-        df['P_HABITABLE'] = df['P_HABITABLE'].astype('category')
-
-        if selected_barchart == 'stellar_type':
-            fig = px.bar(df, x="S_TYPE", hover_name='P_NAME', title="Number of Exoplanets per Stellar Type", color='P_HABITABLE', color_discrete_sequence=['orange', 'skyblue'])
-        elif selected_barchart == 'habitability_count':
-            habitability_counts = df['P_HABITABLE'].value_counts().reset_index()
-            fig = px.bar(habitability_counts, x='index', y='P_HABITABLE', title="Count of Habitable vs Non-Habitable Planets", color='index', color_discrete_map={0: '#FF5733', 1: '#28A745'})
-        return fig
+        return figure_store.get('barchart', selected_barchart)
 
     @dash_app.callback(
         Output('heatmap', 'figure'),
         [Input('factor-dropdown', 'value')]
     )
     def update_heatmap(_):
-        df['P_HABITABLE'] = df['P_HABITABLE'].astype('category')
-
-        # Correlation heatmap
-        correlation_columns = ["P_MASS", "P_RADIUS", "P_TEMP_EQUIL", "P_ESI", "P_HABITABLE"]
-        correlation_df = df[correlation_columns].corr()
-        fig = px.imshow(correlation_df, text_auto=True, title="Correlation Heatmap", color_continuous_scale='Viridis')
-        return fig
+        return figure_store.get('heatmap')
 
     return dash_app
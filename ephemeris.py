@@ -0,0 +1,140 @@
+import numpy as np
+
+from geometry import incline
+
+
+#Vectorized Keplerian ephemeris.
+#Positions for every planet at every timestamp come out of one solve of Kepler's
+#equation (Halley's method, see kepler_anomalies) over a (planets x times) array, so the
+#same code drives the animation frames and any time-scrubbing UI. orbits.js repeats the
+#calculation in the browser for parametric figures.
+
+DAYS_PER_YEAR = 365.25
+
+
+#Periods in days, falling back to Kepler's third law around a solar-mass star
+#(P[yr] = a[AU] ** 1.5) where the catalog has no period
+def fill_periods(semi_major_axes, periods):
+    a = np.asarray(semi_major_axes, dtype=float)
+    periods = np.asarray(periods, dtype=float)
+    return np.where(np.isfinite(periods) & (periods > 0), periods, DAYS_PER_YEAR * a ** 1.5)
+
+
+# elements solved at a time; small enough that every temporary stays in the CPU cache
+KEPLER_BLOCK = 16384
+
+
+#Solving Kepler's equation M = E - e sin(E) for the eccentric anomaly E.
+#mean_anomaly and eccentricity broadcast against each other (e.g. (n, t) against (n, 1));
+#the dtype of mean_anomaly is kept, so float32 input halves the memory traffic when
+#plotting precision is all that is needed.
+def solve_kepler(mean_anomaly, eccentricity, tol=None, max_iter=50):
+    return kepler_anomalies(mean_anomaly, eccentricity, tol, max_iter)[0]
+
+
+#E, sin(E) and cos(E) for solve_kepler's arguments. The arrays are solved in blocks of
+#KEPLER_BLOCK elements with Halley's method (cubic convergence, two to three iterations
+#from the series start below), using preallocated buffers; sin and cos of the result
+#come from the last iteration, corrected for its step, so callers do not evaluate them again.
+def kepler_anomalies(mean_anomaly, eccentricity, tol=None, max_iter=50):
+    M = np.asarray(mean_anomaly)
+    if M.dtype not in (np.float32, np.float64):
+        M = M.astype(np.float64)
+    dtype = M.dtype
+    if tol is None:
+        tol = 1000 * np.finfo(dtype).eps
+    shape = M.shape
+
+    M = np.ascontiguousarray(M).ravel()
+    e = np.ascontiguousarray(np.broadcast_to(np.asarray(eccentricity, dtype=dtype), shape)).ravel()
+    E, sin_E, cos_E = np.empty_like(M), np.empty_like(M), np.empty_like(M)
+    buffers = np.empty((4, min(KEPLER_BLOCK, M.size)), dtype=dtype)
+    for start in range(0, M.size, KEPLER_BLOCK):
+        block = slice(start, start + KEPLER_BLOCK)
+        _kepler_block(M[block], e[block], tol, max_iter, E[block], sin_E[block], cos_E[block], buffers)
+    return E.reshape(shape), sin_E.reshape(shape), cos_E.reshape(shape)
+
+
+def _kepler_block(M, e, tol, max_iter, E, sin_E, cos_E, buffers):
+    size = M.size
+    m, f, g, h = (buffer[:size] for buffer in buffers)
+    two_pi = M.dtype.type(2 * np.pi)
+    # same as np.remainder, which is several times slower than this
+    np.divide(M, two_pi, out=m)
+    np.floor(m, out=m)
+    m *= -two_pi
+    m += M
+
+    # second order series start, E ~ M + e sin(M) (1 + e cos(M))
+    np.sin(m, out=E)
+    E *= e
+    np.cos(m, out=f)
+    f *= e
+    f += 1
+    E *= f
+    E += m
+
+    for _ in range(max_iter):
+        np.sin(E, out=sin_E)
+        np.cos(E, out=cos_E)
+        # f = E - e sin(E) - M, g = 1 - e cos(E)
+        np.multiply(e, sin_E, out=f)
+        np.subtract(E, f, out=f)
+        f -= m
+        np.multiply(e, cos_E, out=g)
+        np.subtract(1, g, out=g)
+        # Halley step f / (g - f e sin(E) / 2g), written into f
+        np.multiply(e, sin_E, out=h)
+        h *= f
+        h /= g
+        h *= 0.5
+        g -= h
+        f /= g
+        E -= f
+        if not np.abs(f).max() > tol:
+            break
+
+    # sin(E - d) ~ sin(E) - d cos(E) and cos(E - d) ~ cos(E) + d sin(E) for the last step d
+    np.multiply(f, cos_E, out=g)
+    f *= sin_E
+    sin_E -= g
+    cos_E += f
+
+
+#Evenly spaced timestamps (days) covering one orbit of the slowest planet by default
+def frame_times(periods, num_frames=100, time_span=None):
+    if time_span is None:
+        time_span = np.nanmax(periods)
+    return np.linspace(0, time_span, num_frames, endpoint=False)
+
+
+#Positions of all planets at all times.
+#Returns x, y, z arrays of shape (number of planets, number of times); the star sits at
+#the focus (shifted to centers when given) and periapsis lies along +x before inclination.
+#float32 by default: the coordinates are drawn (and sent as float32 typed arrays) at that
+#precision anyway; pass dtype=np.float64 for analysis.
+def planet_positions(semi_major_axes, eccentricities, inclinations, periods, times,
+                     mean_anomaly_at_epoch=0.0, centers=None, dtype=np.float32):
+    a = np.atleast_1d(np.asarray(semi_major_axes, dtype=float))
+    periods = fill_periods(a, np.broadcast_to(periods, a.shape))[:, None]
+    a = a[:, None].astype(dtype)
+    e = np.nan_to_num(np.atleast_1d(np.asarray(eccentricities, dtype=dtype)))[:, None]
+    inc = np.deg2rad(np.atleast_1d(np.asarray(inclinations, dtype=dtype)))[:, None]
+    times = np.atleast_1d(np.asarray(times, dtype=float))[None, :]
+    phase = np.atleast_1d(np.asarray(mean_anomaly_at_epoch, dtype=dtype))
+    phase = phase[:, None] if phase.size > 1 else phase
+
+    # the orbit count is taken in float64 and whole orbits are dropped before the cast, so
+    # float32 stays precise when the slowest planet spans thousands of orbits of the fastest
+    orbits = times / periods
+    orbits -= np.floor(orbits)
+    mean_anomaly = orbits.astype(dtype)
+    mean_anomaly *= dtype(2 * np.pi)
+    mean_anomaly += phase
+    _, sin_E, cos_E = kepler_anomalies(mean_anomaly, e)
+
+    cos_E -= e
+    x_plane = np.multiply(a, cos_E, out=cos_E)
+    sin_E *= a * np.sqrt(1 - e ** 2)
+    y_plane = sin_E
+    return incline(x_plane, y_plane, inc, centers)
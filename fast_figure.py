@@ -0,0 +1,173 @@
+import base64
+import json
+import uuid
+from functools import lru_cache
+
+import numpy as np
+
+from instrumentation import Stopwatch
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder gives the same output, only slower
+    orjson = None
+
+
+#Low-level figure serializer for the star system plots.
+#The figure is assembled as plain dicts straight from test.system_geometry, skipping
+#graph_objects validation, and coordinate arrays go out as plotly.js typed array specs
+#(base64 float32 buffers) instead of decimal JSON text.
+
+
+#plotly.js typed array spec; 2-D arrays (surfaces) carry their shape
+def typed_array(values, dtype=np.float32):
+    values = np.ascontiguousarray(values, dtype=dtype)
+    spec = {'dtype': np.dtype(dtype).str[1:], 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+    if values.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in values.shape)
+    return spec
+
+
+#The default plotly.py template, so figures look the same as the graph_objects ones
+@lru_cache(maxsize=1)
+def default_template():
+    import plotly.io as pio
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+#Named colorscales resolved the way plotly.py does it; plotly.js has its own, reversed
+#"Greens" and "Reds", so the names cannot be passed through as they are
+@lru_cache(maxsize=None)
+def colorscale(name):
+    from plotly.colors import get_colorscale
+    return [[float(stop), color] for stop, color in get_colorscale(name)]
+
+
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), default=_json_default)
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _surface(x, y, z, **props):
+    return dict(type='surface', x=typed_array(x), y=typed_array(y), z=typed_array(z), **props)
+
+
+#Triangle indices as the smallest integer type that holds the vertex count (int16 or
+#int32, the types plotly.py picks for them as well)
+def _indices(values, vertex_count):
+    return typed_array(values, np.int16 if vertex_count <= np.iinfo(np.int16).max else np.int32)
+
+
+def _mesh(zone, **props):
+    vertex_count = len(zone['x'])
+    return dict(type='mesh3d', x=typed_array(zone['x']), y=typed_array(zone['y']), z=typed_array(zone['z']),
+                i=_indices(zone['i'], vertex_count), j=_indices(zone['j'], vertex_count),
+                k=_indices(zone['k'], vertex_count), **props)
+
+
+#Same traces, frames and layout as test.generate_system_figure, as plain dicts
+def system_figure_dict(star_name, geometry, layout, planet_colors, frame_mode='delta'):
+    parametric = frame_mode == 'parametric'
+    stopwatch = Stopwatch()
+    x_star, y_star, z_star = (float(v) for v in geometry['star_center'])
+    star_radius = float(geometry['star_radius'])
+    names = [str(name) for name in geometry['planet_names']]
+    radii = [float(radius) for radius in geometry['planet_radii']]
+    planet_mass = float(geometry['planet_mass'])
+
+    static_traces = [
+        dict(type='scatter3d', x=[x_star], y=[y_star], z=[z_star], mode='markers',
+             marker=dict(size=star_radius * 10, color='yellow'), name='Star'),
+        _surface(*geometry['glow'], opacity=0.1, colorscale=[[0, 'yellow'], [1, 'yellow']], showscale=False,
+                 name='Glow'),
+    ]
+
+    # everything but the position is the same in every frame, so it is built once per planet
+    frame_bases = [
+        dict(type='scatter3d', mode='markers+text',
+             marker=dict(size=radius * 10, color=planet_colors.get(name, 'cyan'), symbol='circle'),
+             textposition='top center', name=name, text=name, hoverinfo='name',
+             customdata=[[name, radius, planet_mass]],
+             hovertemplate=('<b>Name:</b> %{customdata[0]}<br>'
+                            '<b>Radius:</b> %{customdata[1]}<br>'
+                            '<b>Mass:</b> %{customdata[2]}<br>'
+                            '<extra></extra>'),
+             textfont=dict(color='black'))
+        for name, radius in zip(names, radii)
+    ]
+    x_paths, y_paths, z_paths = (np.asarray(a, dtype=float).tolist() for a in geometry['paths'])
+
+    x_orbits, y_orbits, z_orbits = geometry['orbits']
+    planet_traces = []
+    for p, (name, radius) in enumerate(zip(names, radii)):
+        static_traces.append(dict(type='scatter3d', x=typed_array(x_orbits[p]), y=typed_array(y_orbits[p]),
+                                  z=typed_array(z_orbits[p]), mode='lines', line=dict(color='white', width=2),
+                                  name=f'Orbit of {name}'))
+        if parametric:
+            # no frame ever replaces this trace, orbits.js only moves it
+            planet_traces.append(dict(frame_bases[p], x=[x_paths[p][0]], y=[y_paths[p][0]], z=[z_paths[p][0]]))
+        else:
+            planet_traces.append(dict(type='scatter3d', x=[float(x_orbits[p][0])], y=[float(y_orbits[p][0])],
+                                      z=[float(z_orbits[p][0])], mode='markers',
+                                      marker=dict(size=radius * 10, color=planet_colors.get(name, 'cyan')),
+                                      name=name, hoverinfo='name'))
+
+    static_traces.extend(_mesh(zone, color=zone['color'], opacity=0.2, name=zone['name'], visible=True,
+                               hoverinfo='none')
+                         for zone in geometry['hz'])
+
+    stopwatch.lap('traces')
+    layout = dict(layout, template=default_template())
+    if parametric:
+        stopwatch.lap('frames')
+        return {'data': static_traces + planet_traces, 'layout': layout}
+
+    planet_indices = list(range(len(static_traces), len(static_traces) + len(planet_traces)))
+
+    frames = []
+    for i in range(geometry['num_frames']):
+        frame_data = list(static_traces) if frame_mode == 'full' else []
+        frame_data.extend(dict(base, x=[x_paths[p][i]], y=[y_paths[p][i]], z=[z_paths[p][i]])
+                          for p, base in enumerate(frame_bases))
+        frame = {'data': frame_data, 'name': f'frame_{i}'}
+        if frame_mode != 'full':
+            frame['traces'] = planet_indices
+        frames.append(frame)
+    frames.append(frames[0])
+    stopwatch.lap('frames')
+    return {'data': static_traces + planet_traces, 'layout': layout, 'frames': frames}
+
+
+#HTML snippet equivalent to fig.to_html(full_html=False, include_plotlyjs='cdn', post_script=post_script);
+#figures without frames are not animated and '{plot_id}' in post_script is the div id
+def figure_to_html(fig_dict, config, plotly_cdn_url, post_script=None):
+    div_id = str(uuid.uuid4())
+    # keep "</script>" inside strings from closing the script tag
+    data = dumps(fig_dict['data']).replace('</', '<\\/')
+    layout = dumps(fig_dict['layout']).replace('</', '<\\/')
+    then = ''
+    if fig_dict.get('frames'):
+        frames = dumps(fig_dict['frames']).replace('</', '<\\/')
+        then = (f'.then(function(){{ Plotly.addFrames("{div_id}", {frames}); }})'
+                f'.then(function(){{ Plotly.animate("{div_id}", null); }})')
+    if post_script:
+        then += f'.then(function(){{ {post_script.replace("{plot_id}", div_id)} }})'
+    return (
+        '<div style="height:100%; width:100%;">'
+        f'<script charset="utf-8" src="{plotly_cdn_url}"></script>'
+        f'<div id="{div_id}" class="plotly-graph-div" style="height:100%; width:100%;"></div>'
+        '<script type="text/javascript">'
+        'window.PLOTLYENV=window.PLOTLYENV || {};'
+        f'if (document.getElementById("{div_id}")) {{'
+        f'Plotly.newPlot("{div_id}", {data}, {layout}, {dumps(config)}){then}'
+        '};</script></div>'
+    )
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from instrumentation import add_to_request
+
+
+#Content-addressed cache for rendered star system figures.
+#Entries are keyed on a hash of the system's rows plus the render parameters, kept
+#in memory up to max_bytes with LRU eviction, and optionally spilled to disk_dir
+#when evicted so a later miss can be served without rebuilding the figure.
+#Entries can be tagged with their star system name so discard() can drop the figures
+#of systems whose rows changed after a catalog reload; spilled entries keep their tag
+#in the file, so an entry read back from disk can still be discarded.
+class FigureCache:
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._names = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        if disk_dir is not None:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(star_name, star_data, row_hashes=None, **params):
+        # row_hashes: the rows' hashes when the caller already has them (StarIndex.row_hashes)
+        if row_hashes is None:
+            row_hashes = pd.util.hash_pandas_object(star_data, index=False).to_numpy()
+        digest = hashlib.sha256()
+        digest.update(str(star_name).encode('utf-8'))
+        digest.update(row_hashes.tobytes())
+        digest.update(repr(tuple(star_data.columns)).encode('utf-8'))
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                add_to_request('cache_hits', 1)
+                return value
+
+        name, value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                add_to_request('cache_misses', 1)
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            add_to_request('cache_hits', 1)
+        self.put(key, value, name=name)
+        return value
+
+    def put(self, key, value, name=None):
+        size = len(value)
+        spilled = []
+        with self._lock:
+            if name is not None:
+                self._names[key] = name
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            if size > self.max_bytes:
+                # too big to ever live in memory, keep it on disk only
+                spilled.append((key, self._names.pop(key, name), value))
+            else:
+                self._entries[key] = value
+                self._size += size
+                while self._size > self.max_bytes:
+                    old_key, old_value = self._entries.popitem(last=False)
+                    old_name = self._names.pop(old_key, None)
+                    self._size -= len(old_value)
+                    self.evictions += 1
+                    spilled.append((old_key, old_name, old_value))
+
+        for old_key, old_name, old_value in spilled:
+            self._write_disk(old_key, old_name, old_value)
+
+    def get_or_create(self, key, build, name=None):
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value, name=name)
+        return value
+
+    #Dropping the in-memory entries tagged with any of names. Spilled copies stay on
+    #disk: their keys hash the old rows, so they are only ever hit by the same data.
+    def discard(self, names):
+        names = set(names)
+        with self._lock:
+            keys = [key for key, name in self._names.items() if name in names]
+            for key in keys:
+                del self._names[key]
+                value = self._entries.pop(key, None)
+                if value is not None:
+                    self._size -= len(value)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._names.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+            }
+
+    # entries are HTML or JSON, so the files get a neutral extension
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f'{key}.entry')
+
+    #(name, value) of a spilled entry; the first line of the file is the name tag
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None, None
+        try:
+            with open(self._disk_path(key), encoding='utf-8', newline='') as f:
+                name, value = f.read().split('\n', 1)
+        except FileNotFoundError:
+            return None, None
+        return name or None, value
+
+    def _write_disk(self, key, name, value):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(f"{name or ''}\n{value}")
+        os.replace(tmp_path, path)
@@ -0,0 +1,196 @@
+import threading
+
+import numpy as np
+from flask import render_template, request, url_for
+
+from catalog import get_star_index
+from fast_figure import default_template, dumps, typed_array
+from geometry import ra_dec_to_cartesian
+
+
+#Catalog-wide spatial layer: every host star in one Cartesian frame (parsecs, from
+#S_RA / S_DEC / S_DISTANCE) with a KD-tree over them, so "which hosts lie within 20 pc
+#of Proxima Centauri" is a tree query instead of a scan. Also draws the overview scene
+#of all hosts at /galaxy, whose markers link to the per-system pages.
+
+# cap on the number of systems one query returns
+MAX_RESULTS = 1000
+
+
+class GalaxyIndex:
+
+    def __init__(self, star_index):
+        self.star_index = star_index
+        systems = star_index.systems
+        frame = star_index.frame
+        starts = np.array([system.start for system in systems], dtype=int)
+
+        def star_column(column):
+            return frame[column].to_numpy(dtype=float)[starts] if len(starts) else np.empty(0)
+
+        x, y, z = ra_dec_to_cartesian(star_column('S_RA'), star_column('S_DEC'), star_column('S_DISTANCE'))
+        points = np.column_stack([x, y, z])
+        # hosts without a position cannot be placed, they stay out of the tree
+        placed = np.flatnonzero(np.isfinite(points).all(axis=1))
+        self.systems = [systems[i] for i in placed]
+        self.points = points[placed]
+        self._row = {system.name: row for row, system in enumerate(self.systems)}
+        # scipy takes a quarter of a second to import, so only once a tree is built
+        from scipy.spatial import cKDTree
+        self.tree = cKDTree(self.points)
+
+        if len(starts):
+            # P_HABITABLE is a class (1 conservative, 2 optimistic), so planets are counted, not values added
+            habitable = np.add.reduceat((frame['P_HABITABLE'].fillna(0).to_numpy() > 0).astype(int), starts)
+            planets = np.diff(np.append(starts, len(frame)))
+        else:
+            habitable = planets = np.empty(0)
+        self.planet_counts = planets[placed].astype(int)
+        self.habitable_counts = habitable[placed].astype(int)
+        self._figure_json = None
+        self._figure_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.systems)
+
+    #Position of a star system, None for unknown names and hosts without a position
+    def position(self, name):
+        system = self.star_index.lookup(name)
+        if system is None or system.name not in self._row:
+            return None
+        return self.points[self._row[system.name]]
+
+    def _results(self, distances, rows, exclude=None):
+        return [(self.systems[row], float(distance)) for distance, row in zip(distances, rows)
+                if self.systems[row].name != exclude]
+
+    #Systems within radius parsecs of a point, nearest first
+    def within(self, point, radius, limit=MAX_RESULTS, exclude=None):
+        rows = np.asarray(self.tree.query_ball_point(point, r=radius), dtype=int)
+        distances = np.linalg.norm(self.points[rows] - point, axis=1) if len(rows) else np.empty(0)
+        order = np.argsort(distances, kind='stable')
+        return self._results(distances[order], rows[order], exclude)[:limit]
+
+    #The k systems nearest to a point
+    def nearest(self, point, k, exclude=None):
+        # one extra neighbour, the query star itself comes back as its own nearest
+        count = min(k + (exclude is not None), len(self))
+        if count == 0:
+            return []
+        distances, rows = self.tree.query(point, k=count)
+        return self._results(np.atleast_1d(distances), np.atleast_1d(rows), exclude)[:k]
+
+    #Plotly figure JSON of every host as one WebGL scatter3d trace, built once per catalog
+    def figure_json(self):
+        with self._figure_lock:
+            if self._figure_json is None:
+                self._figure_json = dumps(self._figure())
+            return self._figure_json
+
+    def _figure(self):
+        names = [system.name for system in self.systems]
+        hover = [f'{name}<br>{planets} planet(s), {habitable} habitable<br>{distance:.1f} pc'
+                 for name, planets, habitable, distance in
+                 zip(names, self.planet_counts, self.habitable_counts, np.linalg.norm(self.points, axis=1))]
+        hosts = dict(
+            type='scatter3d', mode='markers', name='Host stars',
+            x=typed_array(self.points[:, 0]), y=typed_array(self.points[:, 1]), z=typed_array(self.points[:, 2]),
+            marker=dict(size=typed_array(np.clip(2 + self.planet_counts, 2, 10)),
+                        color=typed_array(self.habitable_counts > 0, np.int8),
+                        colorscale=[[0, 'lightskyblue'], [1, 'lime']], cmin=0, cmax=1, opacity=0.8),
+            text=hover, hoverinfo='text',
+            customdata=[url_for('show_star_system_vis', star_system=name) for name in names],
+        )
+        sun = dict(type='scatter3d', mode='markers', name='Sun', x=[0.0], y=[0.0], z=[0.0],
+                   marker=dict(size=4, color='yellow'), hoverinfo='name')
+        layout = dict(
+            title=dict(text=f'{len(names)} host stars'),
+            scene=dict(xaxis=dict(title=dict(text='x (pc)')), yaxis=dict(title=dict(text='y (pc)')),
+                       zaxis=dict(title=dict(text='z (pc)')), bgcolor='black', aspectmode='data'),
+            paper_bgcolor='black', font=dict(color='white'), showlegend=False,
+            margin=dict(l=0, r=0, b=0, t=30),
+            template=default_template(),
+        )
+        return {'data': [hosts, sun], 'layout': layout}
+
+
+_shared = {'star_index': None, 'galaxy': None}
+_shared_lock = threading.Lock()
+
+
+#The galaxy index of the current catalog, rebuilt when a reload swaps the star index
+def get_galaxy_index():
+    star_index = get_star_index()
+    with _shared_lock:
+        if _shared['star_index'] is not star_index:
+            _shared['galaxy'] = GalaxyIndex(star_index)
+            _shared['star_index'] = star_index
+        return _shared['galaxy']
+
+
+def _system_json(system, distance=None):
+    result = {'name': system.name, 'url': url_for('show_star_system_vis', star_system=system.name),
+              'planets': system.stop - system.start}
+    if distance is not None:
+        result['distance'] = round(distance, 6)
+    return result
+
+
+def _float_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    value = float(value)
+    if not np.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+#plot_config and plotly_cdn_url are the ones the star system pages use (test.py)
+def init_app(app, plot_config, plotly_cdn_url):
+
+    @app.route('/galaxy')
+    def galaxy_view():
+        return render_template('galaxy.html', count=len(get_galaxy_index()), plot_config=plot_config,
+                               plotly_cdn_url=plotly_cdn_url)
+
+    @app.route('/api/galaxy/figure.json')
+    def galaxy_figure_json():
+        return app.response_class(get_galaxy_index().figure_json(), mimetype='application/json')
+
+    #?star=<name> or ?x=&y=&z= (parsecs), with radius=<pc> or k=<count>
+    @app.route('/api/galaxy/nearby')
+    def galaxy_nearby():
+        galaxy = get_galaxy_index()
+        try:
+            radius, k = _float_arg('radius'), request.args.get('k', type=int)
+            limit = min(request.args.get('limit', MAX_RESULTS, type=int), MAX_RESULTS)
+            point = [_float_arg(axis) for axis in 'xyz']
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        if (radius is None) == (k is None):
+            return {'error': "Give exactly one of radius and k"}, 400
+        if (radius is not None and radius < 0) or (k is not None and k < 1) or limit < 1:
+            return {'error': "radius must not be negative, k and limit must be positive"}, 400
+
+        star = request.args.get('star')
+        exclude = None
+        if star is not None:
+            position = galaxy.position(star)
+            if position is None:
+                return {'error': f"No position available for {star}"}, 404
+            exclude = galaxy.star_index.lookup(star).name
+            center = {'name': exclude, 'x': position[0], 'y': position[1], 'z': position[2]}
+        elif None not in point:
+            position = np.array(point)
+            center = dict(zip('xyz', point))
+        else:
+            return {'error': "Give a star name or all of x, y and z"}, 400
+
+        if radius is not None:
+            found = galaxy.within(position, radius, limit=limit, exclude=exclude)
+        else:
+            found = galaxy.nearest(position, min(k, limit), exclude=exclude)
+        center = {key: float(value) if key != 'name' else value for key, value in center.items()}
+        return {'center': center, 'radius': radius, 'k': k,
+                'results': [_system_json(system, distance) for system, distance in found]}
@@ -0,0 +1,239 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+#Batched geometry for the 3D star system plots.
+#Everything here works on whole arrays of planets (a system or the full catalog)
+#in one broadcasted operation instead of one Python call per object.
+
+
+#RA and DEC (degrees) to Cartesian coordinates, for single stars or whole columns at once
+def ra_dec_to_cartesian(ra, dec, distance):
+    ra_rad = np.deg2rad(ra)
+    dec_rad = np.deg2rad(dec)
+    x = distance * np.cos(dec_rad) * np.cos(ra_rad)
+    y = distance * np.cos(dec_rad) * np.sin(ra_rad)
+    z = distance * np.sin(dec_rad)
+    return x, y, z
+
+
+@lru_cache(maxsize=None)
+def _unit_circle(num_points):
+    angles = np.linspace(0, 2 * np.pi, num_points)
+    cos_t, sin_t = np.cos(angles), np.sin(angles)
+    cos_t.flags.writeable = False
+    sin_t.flags.writeable = False
+    return cos_t, sin_t
+
+
+#Unit sphere template, computed once per resolution and shared by every caller
+@lru_cache(maxsize=None)
+def unit_sphere(num_points=50):
+    phi = np.linspace(0, np.pi, num_points)
+    theta = np.linspace(0, 2 * np.pi, num_points)
+    phi, theta = np.meshgrid(phi, theta)
+    x = np.sin(phi) * np.cos(theta)
+    y = np.sin(phi) * np.sin(theta)
+    z = np.cos(phi)
+    for arr in (x, y, z):
+        arr.flags.writeable = False
+    return x, y, z
+
+
+def broadcast_centers(centers, count):
+    if centers is None:
+        return np.zeros((count, 3))
+    return np.broadcast_to(np.asarray(centers, dtype=float).reshape(-1, 3), (count, 3))
+
+
+#Rotating in-plane orbit coordinates about the x-axis by the inclination (radians)
+#and shifting them to the star's position
+def incline(x_plane, y_plane, inclinations, centers=None):
+    y = y_plane * np.cos(inclinations)
+    z = y_plane * np.sin(inclinations)
+    if centers is None:
+        return x_plane, y, z
+    centers = broadcast_centers(centers, x_plane.shape[0]).astype(x_plane.dtype, copy=False)
+    return x_plane + centers[:, 0:1], y + centers[:, 1:2], z + centers[:, 2:3]
+
+
+#All orbits at once: ellipses (circles when no eccentricities are given) of the given
+#semi-major axes with the star at one focus, rotated about the x-axis by their
+#inclinations (degrees) and optionally shifted to their star's position.
+#Returns x, y, z arrays of shape (number of planets, num_points).
+def generate_orbits(semi_major_axes, inclinations, num_points=100, centers=None, eccentricities=None):
+    a = np.atleast_1d(np.asarray(semi_major_axes, dtype=float))[:, None]
+    inc = np.deg2rad(np.atleast_1d(np.asarray(inclinations, dtype=float)))[:, None]
+    cos_t, sin_t = _unit_circle(num_points)
+
+    if eccentricities is None:
+        return incline(a * cos_t, a * sin_t, inc, centers)
+
+    # sampled uniformly in eccentric anomaly
+    e = np.nan_to_num(np.atleast_1d(np.asarray(eccentricities, dtype=float)))[:, None]
+    x_plane = a * (cos_t - e)
+    y_plane = a * np.sqrt(1 - e ** 2) * sin_t
+    return incline(x_plane, y_plane, inc, centers)
+
+
+#Level of detail: vertex counts picked from a target screen error.
+#A scene extent of `extent` scene units is assumed to fill SCREEN_PIXELS, and curves are
+#split so no chord strays more than SCREEN_TOLERANCE pixels from the true curve.
+SCREEN_PIXELS = 800
+SCREEN_TOLERANCE = 0.5
+# no segment shorter than this on screen, however sharply the curve turns
+MIN_SEGMENT_PIXELS = 2.0
+# largest change of direction between two orbit segments (radians)
+MAX_TURN = np.pi / 8
+# habitable zone shells are translucent and smoothly shaded, so only their outline can
+# show facets; at this tolerance it is about as close as the old 50x50 sphere surfaces
+MESH_TOLERANCE = 1.5
+PHI = (1 + np.sqrt(5)) / 2
+
+
+def pixels_per_unit(extent, screen_pixels=SCREEN_PIXELS):
+    return screen_pixels / (2 * max(float(extent), 1e-12))
+
+
+#Segments for a full turn around a circle of the given on-screen radius (pixels): a chord
+#spanning an angle `step` misses the arc by r * (1 - cos(step / 2)) ~ r * step^2 / 8
+def segments_for_error(screen_radius, tolerance=SCREEN_TOLERANCE, min_segments=8, max_segments=256):
+    screen_radius = np.maximum(np.asarray(screen_radius, dtype=float), tolerance)
+    step = np.sqrt(8 * tolerance / screen_radius)
+    return np.clip(np.ceil(2 * np.pi / step), min_segments, max_segments).astype(int)
+
+
+#Orbit vertex counts (closed polylines, so segments + 1) for ellipses sampled uniformly in
+#eccentric anomaly. The chord error of such a sampling is bounded by a * step^2 / 8 whatever
+#the eccentricity, but the direction turns up to a / b times faster near periapsis, so
+#eccentric orbits get extra segments there as long as those stay MIN_SEGMENT_PIXELS long.
+def orbit_vertex_counts(semi_major_axes, eccentricities, scale, tolerance=SCREEN_TOLERANCE,
+                        min_points=12, max_points=257):
+    a = np.nan_to_num(np.atleast_1d(np.asarray(semi_major_axes, dtype=float)))
+    e = np.clip(np.nan_to_num(np.atleast_1d(np.asarray(eccentricities, dtype=float))), 0, 0.999)
+    screen_radius = a * scale
+    by_error = segments_for_error(screen_radius, tolerance, min_segments=1, max_segments=max_points - 1)
+    by_turn = np.ceil(2 * np.pi / (MAX_TURN * np.sqrt(1 - e ** 2)))
+    by_length = np.floor(2 * np.pi * screen_radius / MIN_SEGMENT_PIXELS)
+    segments = np.maximum(by_error, np.minimum(by_turn, by_length))
+    return np.clip(segments + 1, min_points, max_points).astype(int)
+
+
+#Orbits with their own vertex count each (see orbit_vertex_counts). Planets that share a
+#count are still generated in one generate_orbits call. Returns lists of x, y, z arrays.
+def generate_orbits_lod(semi_major_axes, inclinations, vertex_counts, centers=None, eccentricities=None):
+    a = np.atleast_1d(np.asarray(semi_major_axes, dtype=float))
+    inc = np.atleast_1d(np.asarray(inclinations, dtype=float))
+    e = np.zeros_like(a) if eccentricities is None else np.atleast_1d(np.asarray(eccentricities, dtype=float))
+    counts = np.broadcast_to(np.asarray(vertex_counts, dtype=int), a.shape)
+    centers = broadcast_centers(centers, len(a))
+    x, y, z = [None] * len(a), [None] * len(a), [None] * len(a)
+    for count in np.unique(counts):
+        rows = np.flatnonzero(counts == count)
+        xs, ys, zs = generate_orbits(a[rows], inc[rows], int(count), centers=centers[rows], eccentricities=e[rows])
+        for n, row in enumerate(rows):
+            x[row], y[row], z[row] = xs[n], ys[n], zs[n]
+    return x, y, z
+
+
+_ICOSAHEDRON_CORNERS = np.array([
+    [-1, PHI, 0], [1, PHI, 0], [-1, -PHI, 0], [1, -PHI, 0], [0, -1, PHI], [0, 1, PHI],
+    [0, -1, -PHI], [0, 1, -PHI], [PHI, 0, -1], [PHI, 0, 1], [-PHI, 0, -1], [-PHI, 0, 1],
+]) / np.sqrt(1 + PHI ** 2)
+_ICOSAHEDRON_FACES = np.array([
+    [0, 11, 5], [0, 5, 1], [0, 1, 7], [0, 7, 10], [0, 10, 11], [1, 5, 9], [5, 11, 4], [11, 10, 2], [10, 7, 6],
+    [7, 1, 8], [3, 9, 4], [3, 4, 2], [3, 2, 6], [3, 6, 8], [3, 8, 9], [4, 9, 5], [2, 4, 11], [6, 2, 10],
+    [8, 6, 7], [9, 8, 1],
+])
+
+
+#Geodesic unit sphere: every icosahedron face split into frequency^2 triangles, projected
+#onto the sphere (10 * frequency^2 + 2 vertices, spread far more evenly than a
+#latitude/longitude grid). Computed once per frequency and shared by every sphere and
+#shell of that frequency; triangles face outwards.
+@lru_cache(maxsize=None)
+def unit_sphere_mesh(frequency):
+    n = frequency
+    a, b = (grid.ravel() for grid in np.meshgrid(np.arange(n + 1), np.arange(n + 1), indexing='ij'))
+    keep = a + b <= n
+    a, b = a[keep], b[keep]
+    local = -np.ones((n + 1, n + 1), dtype=int)
+    local[a, b] = np.arange(len(a))
+
+    # the same triangle grid on every face, in barycentric steps towards its second and third corner
+    up = (a + b) <= n - 1
+    down = (a + b) <= n - 2
+    grid_faces = np.concatenate([
+        np.stack([local[a[up], b[up]], local[a[up] + 1, b[up]], local[a[up], b[up] + 1]], axis=1),
+        np.stack([local[a[down] + 1, b[down]], local[a[down] + 1, b[down] + 1], local[a[down], b[down] + 1]], axis=1),
+    ])
+
+    corners = _ICOSAHEDRON_CORNERS[_ICOSAHEDRON_FACES]
+    weights = np.stack([n - a - b, a, b], axis=1) / n
+    points = np.einsum('pc,fcx->fpx', weights, corners).reshape(-1, 3)
+    points /= np.linalg.norm(points, axis=1)[:, None]
+    # points on shared edges and corners come out of several faces; merge them
+    vertices, index = np.unique(np.round(points, 9), axis=0, return_inverse=True)
+    vertices /= np.linalg.norm(vertices, axis=1)[:, None]
+    offsets = np.arange(len(_ICOSAHEDRON_FACES))[:, None, None] * len(a)
+    faces = index.ravel()[(grid_faces[None] + offsets).reshape(-1, 3)]
+    vertices.flags.writeable = False
+    faces.flags.writeable = False
+    return vertices, faces
+
+
+#Largest gap between a unit sphere and its mesh outline: the sagitta of the longest edge
+@lru_cache(maxsize=None)
+def sphere_mesh_error(frequency):
+    vertices, faces = unit_sphere_mesh(frequency)
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    midpoints = (vertices[edges[:, 0]] + vertices[edges[:, 1]]) / 2
+    return float(1 - np.linalg.norm(midpoints, axis=1).min())
+
+
+#Lowest mesh frequency whose outline stays within tolerance pixels of a sphere of the given
+#on-screen radius
+def sphere_frequency(screen_radius, tolerance=MESH_TOLERANCE, max_frequency=16):
+    for frequency in range(1, max_frequency):
+        if screen_radius * sphere_mesh_error(frequency) <= tolerance:
+            return frequency
+    return max_frequency
+
+
+#Hollow spherical shell between two radii as one mesh sharing a single vertex buffer: the
+#outer sphere followed by the inner one, each at the frequency its on-screen size needs,
+#with the inner triangles flipped to face the centre. Without a usable inner radius
+#(missing, not positive or not below the outer one) only the outer sphere is returned.
+#scale is in pixels per scene unit (pixels_per_unit). Returns the x, y, z vertex and
+#i, j, k triangle arrays of a Mesh3d trace.
+def shell_mesh(inner_radius, outer_radius, scale, center=None):
+    center = broadcast_centers(center, 1)[0]
+    spheres = [(outer_radius, False)]
+    if np.isfinite(inner_radius) and 0 < inner_radius < outer_radius:
+        spheres.append((inner_radius, True))
+
+    points, triangles, offset = [], [], 0
+    for radius, inward in spheres:
+        vertices, faces = unit_sphere_mesh(sphere_frequency(radius * scale))
+        points.append(vertices * radius + center)
+        triangles.append((faces[:, ::-1] if inward else faces) + offset)
+        offset += len(vertices)
+    points, triangles = np.concatenate(points), np.concatenate(triangles)
+    return {'x': points[:, 0], 'y': points[:, 1], 'z': points[:, 2],
+            'i': triangles[:, 0], 'j': triangles[:, 1], 'k': triangles[:, 2]}
+
+
+#Single-object versions with the same signatures as the old helpers in test.py
+def generate_orbit(semi_major_axis, inclination, num_points=100):
+    x, y, z = generate_orbits([semi_major_axis], [inclination], num_points)
+    return x[0], y[0], z[0]
+
+
+#Sphere of the given radius scaled from the shared unit template. Spheres are built one
+#at a time: the template and each sphere fit in the CPU cache, and broadcasting a whole
+#batch into one array is slower than that (benchmark.py generate_sphere).
+def generate_sphere(radius, num_points=50, center=None):
+    unit_x, unit_y, unit_z = unit_sphere(num_points)
+    cx, cy, cz = (0.0, 0.0, 0.0) if center is None else (float(v) for v in np.ravel(center))
+    return radius * unit_x + cx, radius * unit_y + cy, radius * unit_z + cz
@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+
+#gunicorn settings for wsgi.py: `gunicorn wsgi:application` picks this file up from the
+#working directory. The app is imported (and the catalog and caches warmed) once in the
+#master, the workers are forked from it and share that memory copy-on-write.
+
+bind = os.environ.get('EXOVIS_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('EXOVIS_WORKERS', multiprocessing.cpu_count()))
+# threads within a worker share its caches; renders are mostly NumPy and serialization
+worker_class = 'gthread'
+threads = int(os.environ.get('EXOVIS_THREADS', 4))
+preload_app = True
+# the first render of a big system can take a while on a cold cache
+timeout = 120
+# recycled workers are forked again from the preloaded master, so this costs no reload
+max_requests = int(os.environ.get('EXOVIS_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.post_fork()
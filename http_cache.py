@@ -0,0 +1,287 @@
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import g, request
+
+from catalog import get_star_index
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always offered
+    brotli = None
+
+
+#HTTP caching and compression for every response of the app, Dash's included.
+#Pages whose output only depends on the catalog, the code and the query string get a
+#strong ETag derived from those before anything is rendered (the rows of one system for
+#the per-system pages, the whole catalog for the rest), so a conditional GET is
+#answered with 304 without building the figure. Other GET responses get an ETag hashed
+#from their body. HTML, JSON, CSS and JS bodies are gzip or brotli encoded when the
+#client accepts it, static files are linked with a ?v=<content hash> and served as
+#immutable, and Dash's fingerprinted assets keep their long max-age.
+
+# endpoint -> what its output depends on besides the code, the config and the query string
+VERSIONED_ENDPOINTS = {
+    'index': 'dataset',
+    'show_star_system': 'system',
+    'show_star_system_vis': 'system',
+    'system_figure_json': 'system',
+    'galaxy_view': 'dataset',
+    'galaxy_figure_json': 'dataset',
+    'galaxy_nearby': 'dataset',
+    'search_planets': 'dataset',
+}
+# config values that change what the versioned endpoints render
+VERSIONED_CONFIG = ('INDEX_MODE', 'DASHBOARD_MODE')
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                          'application/json', 'image/svg+xml'}
+MIN_COMPRESS_BYTES = 1024
+# files above this size are sent as they are
+MAX_FILE_BYTES = 8 * 1024 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# compressed copies of responses that carry an ETag, so the same page is not
+# recompressed for every client
+COMPRESSED_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class _CompressedBodies:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._size -= len(self._entries.popitem(last=False)[1])
+
+
+#Hash of the app's modules and templates: a deploy changes every versioned ETag
+def code_version(root):
+    digest = hashlib.sha256()
+    for directory in (root, os.path.join(root, 'templates')):
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(('.py', '.html')):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    digest.update(name.encode('utf-8') + b'\0' + f.read())
+    return digest.hexdigest()
+
+
+#Version tokens of the current catalog: one for the whole frame and one per system (the
+#star index's system digests), computed on first use and dropped when a reload swaps the
+#star index
+class DatasetVersions:
+
+    def __init__(self):
+        self._star_index = None
+        self._dataset = None
+        self._lock = threading.Lock()
+
+    def _current(self):
+        star_index = get_star_index()
+        with self._lock:
+            if self._star_index is not star_index:
+                self._star_index, self._dataset = star_index, None
+        return star_index
+
+    def dataset(self):
+        star_index = self._current()
+        if self._dataset is None:
+            self._dataset = hashlib.sha256(star_index.row_hashes().tobytes()).hexdigest()
+        return self._dataset
+
+    def system(self, name):
+        star_index = self._current()
+        system = star_index.lookup(name)
+        if system is None:
+            return self.dataset()
+        return star_index.digests()[system.name]
+
+
+def _encoding(accept_encodings):
+    if brotli is not None and 'br' in accept_encodings:
+        return 'br'
+    if 'gzip' in accept_encodings:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(level, 11))
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+#gzip of a streamed body, flushed after every chunk so each part still goes out as
+#soon as it is rendered
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+#True when If-None-Match holds the ETag, or one of its encoded variants
+def _not_modified(etag):
+    candidates = request.if_none_match
+    return candidates.star_tag or any(candidates.contains(tag)
+                                      for tag in (etag, f'{etag}-gzip', f'{etag}-br'))
+
+
+def init_app(app):
+    app.config.setdefault('HTTP_COMPRESSION', True)
+    app.config.setdefault('COMPRESSION_LEVEL', 6)
+    code = code_version(app.root_path)
+    versions = app.extensions['http_cache'] = DatasetVersions()
+    compressed = _CompressedBodies(COMPRESSED_CACHE_BYTES)
+    static_hashes = {}
+
+    def static_hash(filename):
+        path = os.path.join(app.static_folder or '', filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = static_hashes.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, 'rb') as f:
+                cached = static_hashes[path] = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+        return cached[1]
+
+    # url_for('static', filename=...) links carry the file's content hash
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = static_hash(values['filename'])
+            if version is not None:
+                values['v'] = version
+
+    def version_etag():
+        scope = VERSIONED_ENDPOINTS.get(request.endpoint)
+        if scope is None:
+            return None
+        if scope == 'system':
+            data_version = versions.system((request.view_args or {}).get('star_system', ''))
+        else:
+            data_version = versions.dataset()
+        digest = hashlib.sha256()
+        for part in (code, data_version, request.full_path,
+                     repr([app.config.get(key) for key in VERSIONED_CONFIG])):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()[:40]
+
+    @app.before_request
+    def answer_not_modified():
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        etag = version_etag()
+        if etag is None:
+            return None
+        g.version_etag = etag
+        if _not_modified(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['Vary'] = 'Accept-Encoding'
+            return response
+        return None
+
+    @app.after_request
+    def cache_and_compress(response):
+        if response.status_code == 304 or 'Content-Encoding' in response.headers:
+            return response
+        cacheable = request.method in ('GET', 'HEAD') and response.status_code == 200
+
+        if cacheable:
+            if request.endpoint == 'static' and request.args.get('v') == static_hash(request.view_args['filename']):
+                response.headers['Cache-Control'] = IMMUTABLE
+            elif '/assets/' in request.path and 'm' in request.args:
+                # Dash links its assets with ?m=<modification time>
+                response.headers['Cache-Control'] = IMMUTABLE
+            elif 'version_etag' in g:
+                response.set_etag(g.version_etag)
+                # data can be reloaded under a running app, so always revalidate
+                response.headers['Cache-Control'] = 'no-cache'
+            elif not response.is_streamed and not response.direct_passthrough \
+                    and response.mimetype in COMPRESSIBLE_MIMETYPES and 'ETag' not in response.headers:
+                response.add_etag()
+            etag = response.get_etag()[0]
+            if etag and _not_modified(etag):
+                response = app.response_class(status=304, headers={'ETag': response.headers['ETag'],
+                                                                    'Cache-Control': response.headers.get(
+                                                                        'Cache-Control', 'no-cache')})
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+
+        if not app.config['HTTP_COMPRESSION'] or response.mimetype not in COMPRESSIBLE_MIMETYPES \
+                or response.status_code < 200 or response.status_code == 204:
+            return response
+        if response.direct_passthrough:
+            # files sent by send_file (static files, Dash assets) are read in to be encoded
+            if response.content_length is None or response.content_length > MAX_FILE_BYTES:
+                return response
+            response.direct_passthrough = False
+        response.vary.add('Accept-Encoding')
+        encoding = _encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+        level = app.config['COMPRESSION_LEVEL']
+
+        if response.is_streamed:
+            if 'gzip' not in request.accept_encodings:
+                return response
+            response.response = _gzip_stream(response.response, level)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.pop('Content-Length', None)
+            etag, weak = response.get_etag()
+            if etag:
+                response.set_etag(f'{etag}-gzip', weak=weak)
+            return response
+
+        body = response.get_data()
+        if len(body) < MIN_COMPRESS_BYTES:
+            return response
+        etag, weak = response.get_etag()
+        # fingerprinted Dash bundles carry a long max-age but no ETag
+        long_lived = (response.cache_control.max_age or 0) >= 86400
+        key = (etag or (request.full_path if long_lived else None), encoding) if cacheable else None
+        if key and key[0] is None:
+            key = None
+        encoded = compressed.get(key) if key else None
+        if encoded is None:
+            encoded = _compress(body, encoding, level)
+            if key:
+                compressed.put(key, encoded)
+        response.set_data(encoded)
+        response.headers['Content-Encoding'] = encoding
+        # each encoding is a different representation, so it gets its own ETag
+        if etag:
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        return response
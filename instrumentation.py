@@ -0,0 +1,238 @@
+import bisect
+import contextvars
+import cProfile
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+#Hot-path timing and payload metrics for the render path and the dashboard.
+#Stages (geometry, traces, frames, serialize, ...) are timed with Stopwatch laps and end
+#up in three places: process-wide Prometheus histograms served at /metrics, the
+#per-system record of the render that is running (the last RECENT_RENDERS of them are
+#served at /metrics/renders), and the totals of the current request, which go out in a
+#Server-Timing header. Setting PROFILING in the app config lets ?profile=1 run a single
+#request under cProfile and dump the stats to PROFILE_DIR (pstats format, which
+#snakeviz, flameprof or gprof2dot turn into a flame graph).
+
+PREFIX = 'exovis'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_RENDERS = 200
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+#Counters and histograms in the Prometheus text exposition format, plus collector
+#callbacks that report values owned by someone else (cache sizes) at scrape time
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                     'count': 0, 'sum': 0.0}
+            index = bisect.bisect_left(histogram['buckets'], value)
+            if index < len(buckets):
+                histogram['counts'][index] += 1
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    #collector() returns (name, type, labels dict, value) tuples
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    #Dropping every recorded value (collectors stay registered)
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: dict(value, counts=list(value['counts'])) for key, value in self._histograms.items()}
+
+        families = {}
+        for (name, labels), value in counters.items():
+            families.setdefault(name, ('counter', []))[1].append(f'{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), histogram in histograms.items():
+            lines = families.setdefault(name, ('histogram', []))[1]
+            cumulative = 0
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", f"{bound:g}")])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]:g}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+        for collector in self._collectors:
+            for name, kind, labels, value in collector():
+                families.setdefault(name, (kind, []))[1].append(f'{name}{_format_labels(_labels(labels))} {value:g}')
+
+        out = []
+        for name in sorted(families):
+            kind, lines = families[name]
+            if name in self._help:
+                out.append(f'# HELP {name} {self._help[name]}')
+            out.append(f'# TYPE {name} {kind}')
+            out.extend(lines)
+        return '\n'.join(out) + '\n'
+
+
+REGISTRY = Registry()
+REGISTRY.describe(f'{PREFIX}_render_stage_seconds', 'Time spent per render stage')
+REGISTRY.describe(f'{PREFIX}_render_output_bytes_total', 'Bytes produced by star system renders')
+REGISTRY.describe(f'{PREFIX}_renders_total', 'Star system renders (cache misses)')
+REGISTRY.describe(f'{PREFIX}_http_request_duration_seconds', 'Time until the response is handed to the server')
+REGISTRY.describe(f'{PREFIX}_dash_callback_seconds', 'Dash callback request latency per output')
+
+# per-request totals and the per-system record of the render in progress
+_request_totals = contextvars.ContextVar('request_totals', default=None)
+_current_render = contextvars.ContextVar('current_render', default=None)
+recent_renders = deque(maxlen=RECENT_RENDERS)
+
+
+def record_stage(name, seconds):
+    REGISTRY.observe(f'{PREFIX}_render_stage_seconds', seconds, stage=name)
+    render = _current_render.get()
+    if render is not None:
+        render['stages'][name] = render['stages'].get(name, 0.0) + seconds
+    add_to_request(name, seconds)
+
+
+#Adding to a per-request total (seconds of a stage, or a count such as cache hits)
+def add_to_request(name, amount):
+    totals = _request_totals.get()
+    if totals is not None:
+        totals[name] = totals.get(name, 0) + amount
+
+
+#Stage timer for straight-line code: each lap records the time since the previous one
+class Stopwatch:
+
+    def __init__(self):
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        record_stage(name, now - self._last)
+        self._last = now
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+#Collecting the stages of one star system render; the caller sets record['bytes']
+@contextmanager
+def render_record(star_name, kind):
+    record = {'system': str(star_name), 'kind': kind, 'stages': {}, 'bytes': 0}
+    token = _current_render.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        _current_render.reset(token)
+        record['seconds'] = time.perf_counter() - start
+        recent_renders.append(record)
+        REGISTRY.inc(f'{PREFIX}_renders_total', kind=kind)
+        REGISTRY.inc(f'{PREFIX}_render_output_bytes_total', record['bytes'], kind=kind)
+
+
+def _server_timing(totals):
+    return ', '.join(f'{re.sub(r"[^A-Za-z0-9_-]", "_", name)};dur={value * 1000:.2f}'
+                     if isinstance(value, float) else f'{name};desc="{value}"'
+                     for name, value in totals.items())
+
+
+def _profile_path(directory, path):
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', path.strip('/')) or 'index'
+    return os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{name}.prof')
+
+
+#Request timing, Server-Timing headers, the profiling toggle and the /metrics routes.
+#Flask is only imported here so the render path can be timed without it (worker
+#processes, benchmark.py).
+def init_app(app):
+    from flask import Response, g, request
+
+    app.config.setdefault('PROFILING', False)
+    app.config.setdefault('PROFILE_DIR', 'profiles')
+
+    @app.before_request
+    def start_request():
+        g.instrumentation_start = time.perf_counter()
+        g.instrumentation_token = _request_totals.set({})
+        if app.config['PROFILING'] and request.args.get('profile'):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def finish_request(response):
+        start = g.pop('instrumentation_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        endpoint = request.endpoint or 'unmatched'
+        # only answered callbacks, so made-up output ids cannot add label values
+        if request.path.endswith('/_dash-update-component') and response.status_code < 400:
+            body = request.get_json(silent=True) or {}
+            REGISTRY.observe(f'{PREFIX}_dash_callback_seconds', elapsed, output=body.get('output', 'unknown'))
+        REGISTRY.observe(f'{PREFIX}_http_request_duration_seconds', elapsed, endpoint=endpoint)
+
+        totals = _request_totals.get() or {}
+        _request_totals.reset(g.pop('instrumentation_token'))
+        totals['total'] = elapsed
+        response.headers['Server-Timing'] = _server_timing(totals)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+            path = _profile_path(app.config['PROFILE_DIR'], request.path)
+            profiler.dump_stats(path)
+            response.headers['X-Profile'] = path
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route('/metrics/renders')
+    def metrics_renders():
+        return {'renders': list(recent_renders)}
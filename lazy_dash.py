@@ -0,0 +1,35 @@
+import threading
+
+
+#Mounting the Dash dashboard without importing Dash when the app starts.
+#Dash adds its routes to a Flask server as it is created, and Flask refuses new routes
+#once it has handled a request, so the dashboard gets a Flask server of its own, built
+#by build() on the first request under prefix (or by load()). This sits in front of the
+#main app's WSGI callable and hands every other path straight to it.
+class LazyDashboard:
+
+    def __init__(self, app, prefix, build):
+        self.prefix = prefix
+        self.build = build
+        self._server = None
+        self._lock = threading.Lock()
+        self._wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+
+    @property
+    def loaded(self):
+        return self._server is not None
+
+    #The dashboard's Flask server, built on the first call
+    def load(self):
+        if self._server is None:
+            with self._lock:
+                if self._server is None:
+                    self._server = self.build()
+        return self._server
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == self.prefix.rstrip('/') or path.startswith(self.prefix):
+            return self.load()(environ, start_response)
+        return self._wsgi_app(environ, start_response)
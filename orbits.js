@@ -0,0 +1,90 @@
+// Browser-side orbit animation for star system figures rendered with
+// frame_mode='parametric' (test.py). Instead of per-frame coordinates the figure
+// carries every planet's orbital elements in layout.meta.orbits; each animation frame
+// solves Kepler's equation for the current time and moves only the planet traces (the
+// last traces of the figure) with Plotly.restyle. The Play/Pause buttons of the figure
+// are 'skip' buttons that this script listens for.
+window.ExoOrbits = (function () {
+    'use strict';
+
+    // Eccentric anomaly from the mean anomaly: Newton's method from the same second
+    // order start as ephemeris.kepler_anomalies, which takes Halley steps instead. Both
+    // converge to the same E; positions match planet_positions(dtype=np.float64) to
+    // about 1e-8 of the orbit and the default float32 frames up to float32 rounding
+    // (test_ephemeris.py runs this file against them)
+    function eccentricAnomaly(M, e) {
+        let E = M + e * Math.sin(M) * (1 + e * Math.cos(M));
+        for (let i = 0; i < 20; i++) {
+            const step = (E - e * Math.sin(E) - M) / (1 - e * Math.cos(E));
+            E -= step;
+            if (Math.abs(step) < 1e-10) {
+                break;
+            }
+        }
+        return E;
+    }
+
+    // Position of planet p after the given number of days, as in ephemeris.planet_positions:
+    // star at the focus, periapsis along +x, orbit tilted about the x axis
+    function position(orbits, p, days) {
+        const a = orbits.a[p], e = orbits.e[p], inc = orbits.inc[p], center = orbits.center;
+        const turns = days / orbits.period[p];
+        const E = eccentricAnomaly(2 * Math.PI * (turns - Math.floor(turns)), e);
+        const xPlane = a * (Math.cos(E) - e);
+        const yPlane = a * Math.sqrt(1 - e * e) * Math.sin(E);
+        return [xPlane + center[0], yPlane * Math.cos(inc) + center[1], yPlane * Math.sin(inc) + center[2]];
+    }
+
+    function animate(gd) {
+        const orbits = gd && gd.layout && gd.layout.meta && gd.layout.meta.orbits;
+        if (!orbits) {
+            return;
+        }
+        const first = gd.data.length - orbits.a.length;
+        // planets without a usable orbit stay where the server put them
+        const planets = orbits.a.map((a, p) => p).filter(
+            (p) => orbits.a[p] !== null && orbits.inc[p] !== null && orbits.period[p] !== null);
+        const traces = planets.map((p) => first + p);
+        if (!planets.length) {
+            return;
+        }
+
+        let playing = true;
+        let busy = false;
+        let days = 0;
+        let last = null;
+        gd.on('plotly_buttonclicked', (event) => {
+            playing = event.button.label === 'Play';
+        });
+
+        function tick(now) {
+            if (!document.body.contains(gd)) {
+                return;
+            }
+            if (playing) {
+                if (last !== null) {
+                    days += (now - last) / 1000 * orbits.days_per_second;
+                }
+                last = now;
+                // one restyle at a time, a slow redraw skips frames instead of queueing them
+                if (!busy) {
+                    const update = {x: [], y: [], z: []};
+                    planets.forEach((p) => {
+                        const [x, y, z] = position(orbits, p, days);
+                        update.x.push([x]);
+                        update.y.push([y]);
+                        update.z.push([z]);
+                    });
+                    busy = true;
+                    Plotly.restyle(gd, update, traces).then(() => { busy = false; }, () => { busy = false; });
+                }
+            } else {
+                last = null;
+            }
+            window.requestAnimationFrame(tick);
+        }
+        window.requestAnimationFrame(tick);
+    }
+
+    return {animate: animate, position: position};
+})();
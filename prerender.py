@@ -0,0 +1,234 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+
+from flask import request, send_file
+
+import catalog
+from catalog import get_star_index, normalize_star_name
+from figure_cache import FigureCache
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip siblings are always written
+    brotli = None
+
+
+#Offline pre-render of every page of the Flask app into a static directory.
+#Pages are written with .gz (and .br when brotli is installed) siblings and listed in
+#a manifest together with their content hashes and the hash of the rows they were built
+#from, so a rebuild only touches the systems whose data changed. When the directory
+#exists the app serves these files directly instead of computing figures per request.
+
+PRERENDERED_DIR = "prerendered"
+MANIFEST_NAME = "manifest.json"
+
+# anything that changes the rendered output besides the data itself; the static files
+# count too, the pages link them with a ?v=<content hash> that is served as immutable
+SOURCE_FILES = ['vis.py', 'test.py', 'catalog.py', 'geometry.py', 'ephemeris.py', 'fast_figure.py',
+                'index.html', 'base.html', 'star_systems.html', 'star_system_vis.html', 'galaxy.html',
+                'styles.css', 'orbits.js']
+# where a source file may live, relative to the app; Flask's folders come first
+SOURCE_DIRS = ['templates', 'static', '']
+
+MIMETYPES = {'.html': 'text/html; charset=utf-8', '.json': 'application/json'}
+
+
+#Manifest key for a request path, using the same name normalization as StarIndex
+def page_key(path):
+    name = path.strip('/')
+    if not name:
+        return 'index'
+    if name.startswith('api/system/') and name.endswith('/figure.json'):
+        return 'figure:' + normalize_star_name(name[len('api/system/'):-len('/figure.json')])
+    if name.endswith('_vis'):
+        return 'vis:' + normalize_star_name(name[:-len('_vis')])
+    return 'info:' + normalize_star_name(name)
+
+
+def _slug(name):
+    return re.sub(r'[^a-z0-9]+', '-', normalize_star_name(name)).strip('-') or 'system'
+
+
+def build_fingerprint(base_dir='.'):
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES:
+        for directory in SOURCE_DIRS:
+            path = os.path.join(base_dir, directory, name)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    digest.update(name.encode('utf-8') + b'\0' + f.read())
+                break
+    return digest.hexdigest()
+
+
+def load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_bytes(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+#Writing one artifact and its compressed siblings, returning its manifest entry
+def write_artifact(out_dir, rel_path, data):
+    path = os.path.join(out_dir, rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_bytes(path, data)
+    encodings = ['gzip']
+    _write_bytes(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_bytes(path + '.br', brotli.compress(data, quality=11))
+        encodings.append('br')
+    return {'file': rel_path, 'sha256': hashlib.sha256(data).hexdigest(), 'bytes': len(data),
+            'encodings': encodings}
+
+
+def remove_artifact(out_dir, entry):
+    for suffix in ('', '.gz', '.br'):
+        try:
+            os.remove(os.path.join(out_dir, entry['file'] + suffix))
+        except FileNotFoundError:
+            pass
+
+
+def _get(client, path):
+    response = client.get(path)
+    if response.status_code != 200:
+        raise RuntimeError(f"Pre-rendering {path} failed with status {response.status_code}")
+    return response.get_data()
+
+
+#Rendering every page (and per-system figure JSON) into out_dir, skipping systems
+#whose rows and build fingerprint are unchanged since the last build
+def build(out_dir=PRERENDERED_DIR, force=False):
+    import vis  # imported here so the app is only set up when a build actually runs
+
+    vis.app.config['PRERENDERED_DIR'] = None  # always render live while building
+    client = vis.app.test_client()
+    star_index = get_star_index()
+
+    previous = None if force else load_manifest(out_dir)
+    fingerprint = build_fingerprint()
+    if previous is not None and previous.get('fingerprint') != fingerprint:
+        previous = None
+    old_pages = previous['pages'] if previous else {}
+    old_systems = previous['systems'] if previous else {}
+
+    pages = {}
+    systems = {}
+    changed = []
+    for system in star_index.systems:
+        key = normalize_star_name(system.name)
+        source_hash = FigureCache.make_key(system.name, star_index.rows(system), row_hashes=star_index.row_hashes(system))
+        keys = ['info:' + key, 'vis:' + key, 'figure:' + key]
+        up_to_date = (old_systems.get(key) == source_hash
+                      and all(k in old_pages and os.path.exists(os.path.join(out_dir, old_pages[k]['file']))
+                              for k in keys))
+        systems[key] = source_hash
+        if up_to_date:
+            pages.update({k: old_pages[k] for k in keys})
+            continue
+
+        changed.append(system.name)
+        slug = _slug(system.name)
+        print(f"Pre-rendering star system: {system.name}")
+        pages[keys[0]] = write_artifact(out_dir, f'{slug}/index.html', _get(client, f'/{system.name}'))
+        pages[keys[1]] = write_artifact(out_dir, f'{slug}/vis.html', _get(client, f'/{system.name}_vis'))
+        pages[keys[2]] = write_artifact(out_dir, f'{slug}/figure.json',
+                                        _get(client, f'/api/system/{system.name}/figure.json'))
+
+    removed = [k for k in old_pages if k not in pages and k != 'index']
+    for k in removed:
+        remove_artifact(out_dir, old_pages[k])
+
+    if changed or removed or 'index' not in old_pages:
+        print("Pre-rendering index page")
+        pages['index'] = write_artifact(out_dir, 'index.html', _get(client, '/'))
+    else:
+        pages['index'] = old_pages['index']
+
+    manifest = {'fingerprint': fingerprint, 'systems': systems, 'pages': pages}
+    _write_bytes(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=1).encode('utf-8'))
+    return {'changed': changed, 'removed': removed}
+
+
+#Serving pre-rendered pages from a before_request hook, picking the best encoding the
+#client accepts. The manifest is re-read whenever the build rewrites it. Systems that
+#changed in a catalog reload since are rendered live until the next build.
+def init_app(app, out_dir=PRERENDERED_DIR):
+    app.config.setdefault('PRERENDERED_DIR', out_dir)
+    state = {'mtime': None, 'manifest': None, 'stale': set()}
+
+    @catalog.subscribe
+    def mark_stale(changed, frame, star_index):
+        names = {normalize_star_name(name) for name in changed}
+        state['stale'] = state['stale'] | {prefix + name for name in names
+                                           for prefix in ('info:', 'vis:', 'figure:')} | {'index'}
+
+    def current_manifest(directory):
+        path = os.path.join(directory, MANIFEST_NAME)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime != state['mtime']:
+            state['manifest'] = load_manifest(directory)
+            state['mtime'] = mtime
+            state['stale'] = set()
+        return state['manifest']
+
+    @app.before_request
+    def serve_prerendered():
+        directory = app.config['PRERENDERED_DIR']
+        if not directory or request.method not in ('GET', 'HEAD') or request.args:
+            return None
+        manifest = current_manifest(directory)
+        if manifest is None:
+            return None
+        key = page_key(request.path)
+        entry = manifest['pages'].get(key)
+        if entry is None or key in state['stale']:
+            return None
+
+        path = os.path.join(directory, entry['file'])
+        encoding = None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if name in entry['encodings'] and name in request.accept_encodings:
+                path, encoding = path + suffix, name
+                break
+        if not os.path.exists(path):
+            return None
+
+        # each encoding is a different representation, so it gets its own strong ETag
+        etag = entry['sha256'] if encoding is None else f"{entry['sha256']}-{encoding}"
+        response = send_file(path, mimetype=MIMETYPES[os.path.splitext(entry['file'])[1]], etag=etag,
+                             conditional=True)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render every star system page into a static directory")
+    parser.add_argument('--out', default=PRERENDERED_DIR, help="output directory (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="rebuild every page even if its data is unchanged")
+    args = parser.parse_args()
+
+    result = build(args.out, force=args.force)
+    print(f"{len(result['changed'])} system(s) rebuilt, {len(result['removed'])} page(s) removed")
+
+
+if __name__ == '__main__':
+    main()
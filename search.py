@@ -0,0 +1,239 @@
+import fnmatch
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+from flask import request
+
+from catalog import FLAG_COLUMNS, display_frame, get_star_index
+
+
+#Indexed planet search behind /api/planets.
+#Numeric columns get a sorted index (row ids ordered by value), so a range filter is two
+#binary searches; flag and categorical columns get one bitmap (packed bits, one per row)
+#per value. A query ANDs the bitmaps of its filters and only then touches the rows of the
+#requested page, so compound filters never scan the DataFrame.
+
+# query parameter -> numeric column, filtered with <name>_min / <name>_max
+NUMERIC_FILTERS = {
+    'esi': 'P_ESI',
+    'mass': 'P_MASS',
+    'radius': 'P_RADIUS',
+    'temp': 'P_TEMP_EQUIL',
+    'period': 'P_PERIOD',
+    'semi_major_axis': 'P_SEMI_MAJOR_AXIS',
+    'eccentricity': 'P_ECCENTRICITY',
+    'flux': 'P_FLUX',
+    'distance': 'S_DISTANCE',
+    's_temp': 'S_TEMPERATURE',
+}
+# query parameter -> flag or categorical column; comma separated values are ORed and
+# categorical values may use shell wildcards (s_type=M*)
+CATEGORY_FILTERS = {
+    'habitable': 'P_HABITABLE',
+    'hz_opt': 'P_HABZONE_OPT',
+    'hz_con': 'P_HABZONE_CON',
+    'type': 'P_TYPE_TEMP',
+    's_type': 'S_TYPE',
+    'detection': 'P_DETECTION',
+    'star': 'S_NAME',
+}
+# hz=<zone> is shorthand for the flag of that habitable zone
+HABITABLE_ZONE_FLAGS = {'optimistic': 'P_HABZONE_OPT', 'conservative': 'P_HABZONE_CON'}
+
+RESULT_COLUMNS = ['P_NAME', 'S_NAME', 'S_TYPE', 'P_TYPE_TEMP', 'P_HABITABLE', 'P_HABZONE_OPT', 'P_HABZONE_CON',
+                  'P_ESI', 'P_MASS', 'P_RADIUS', 'P_TEMP_EQUIL', 'P_PERIOD', 'P_SEMI_MAJOR_AXIS', 'S_DISTANCE']
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# columns with more distinct values than this (S_NAME) build their bitmaps per query
+MAX_BITMAP_VALUES = 256
+
+
+#Raised for query parameters that cannot be turned into a filter
+class QueryError(ValueError):
+    pass
+
+
+#float32 columns stay float32, so bounds are compared at the precision the values were stored in
+def _float_values(series):
+    values = series.to_numpy()
+    return values if values.dtype.kind == 'f' else series.to_numpy(dtype=float)
+
+
+#Row ids of one numeric column in value order; missing values are left out
+class SortedIndex:
+
+    def __init__(self, values):
+        present = np.flatnonzero(~np.isnan(values))
+        order = np.argsort(values[present], kind='stable')
+        self.rows = present[order]
+        self.values = values[self.rows]
+
+    #Row ids with lo <= value <= hi (either bound may be None)
+    def range(self, lo=None, hi=None):
+        # bounds beyond float32 range become +-inf, which still compare correctly
+        with np.errstate(over='ignore'):
+            return self._range(lo, hi)
+
+    def _range(self, lo, hi):
+        start = 0 if lo is None else np.searchsorted(self.values, self.values.dtype.type(lo), side='left')
+        stop = len(self.values) if hi is None else np.searchsorted(self.values, self.values.dtype.type(hi),
+                                                                   side='right')
+        return self.rows[start:stop]
+
+
+#Rows per value of a flag or categorical column: row ids grouped by value (posting
+#lists), plus a ready-made bitmap per value for columns with few distinct values
+class CategoryIndex:
+
+    def __init__(self, codes, labels, size):
+        self.size = size
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+        self.postings = {str(label): order[bounds[code]:bounds[code + 1]] for code, label in enumerate(labels)}
+        self.bitmaps = {}
+        if len(labels) <= MAX_BITMAP_VALUES:
+            self.bitmaps = {label: rows_bitmap(rows, size) for label, rows in self.postings.items()}
+
+    def labels(self, value):
+        if not any(char in value for char in '*?['):
+            return [value] if value in self.postings else []
+        pattern = re.compile(fnmatch.translate(value))
+        return [label for label in self.postings if pattern.match(label)]
+
+    #Bitmap of the rows matching any of the (wildcard) values
+    def matching(self, values):
+        labels = {label for value in values for label in self.labels(value)}
+        bitmaps = [self.bitmaps[label] for label in labels if label in self.bitmaps]
+        postings = [self.postings[label] for label in labels if label not in self.bitmaps]
+        result = rows_bitmap(np.concatenate(postings), self.size) if postings else \
+            np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        for bitmap in bitmaps:
+            result |= bitmap
+        return result
+
+
+def rows_bitmap(rows, size):
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return np.packbits(mask)
+
+
+class SearchIndex:
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.size = len(frame)
+        self.numeric = {column: SortedIndex(_float_values(frame[column])) for column in set(NUMERIC_FILTERS.values())}
+        self.categories = {}
+        for column in set(CATEGORY_FILTERS.values()) | set(HABITABLE_ZONE_FLAGS.values()):
+            values = frame[column]
+            if column in FLAG_COLUMNS:
+                # 0/1 flags, but P_HABITABLE also uses 2 (optimistic habitable zone)
+                codes = values.to_numpy().astype(int)
+                labels = list(range(max(int(codes.max(initial=0)) + 1, 2)))
+            else:
+                codes, labels = values.cat.codes.to_numpy().astype(int), list(values.cat.categories)
+            # missing values (code -1) and anything outside the labels match no value
+            codes = np.where((codes >= 0) & (codes < len(labels)), codes, len(labels))
+            self.categories[column] = CategoryIndex(codes, labels, self.size)
+        self.all_rows = np.packbits(np.ones(self.size, dtype=bool))
+
+    def category(self, column, values):
+        return self.categories[column].matching(values)
+
+    def numeric_range(self, column, lo=None, hi=None):
+        return rows_bitmap(self.numeric[column].range(lo, hi), self.size)
+
+    #Row ids matching every filter, in catalog order or sorted by a numeric column
+    #(missing values last); filters are (kind, column, arguments) tuples
+    def rows(self, filters, sort=None, descending=False):
+        bitmap = self.all_rows.copy()
+        for kind, column, arguments in filters:
+            bitmap &= self.category(column, arguments) if kind == 'category' else \
+                self.numeric_range(column, *arguments)
+        mask = np.unpackbits(bitmap, count=self.size).astype(bool)
+        if sort is None:
+            return np.flatnonzero(mask)
+        ordered = self.numeric[sort].rows
+        if descending:
+            ordered = ordered[::-1]
+        missing = np.setdiff1d(np.flatnonzero(mask), ordered, assume_unique=True)
+        return np.concatenate([ordered[mask[ordered]], missing])
+
+    def records(self, rows):
+        page = display_frame(self.frame.iloc[rows][RESULT_COLUMNS])
+        return [{key: None if pd.isna(value) else value.item() if isinstance(value, np.generic) else value
+                 for key, value in record.items()}
+                for record in page.to_dict('records')]
+
+
+#Filters of a query string (a werkzeug MultiDict) as (kind, column, arguments) tuples
+def parse_filters(args):
+    filters = []
+    for name, column in NUMERIC_FILTERS.items():
+        bounds = []
+        for suffix in ('_min', '_max'):
+            value = args.get(name + suffix)
+            if value is None:
+                bounds.append(None)
+                continue
+            try:
+                value = float(value)
+            except ValueError:
+                raise QueryError(f"{name + suffix} must be a number") from None
+            if np.isnan(value):
+                raise QueryError(f"{name + suffix} must be a number")
+            bounds.append(value)
+        if bounds != [None, None]:
+            filters.append(('numeric', column, tuple(bounds)))
+
+    for name, column in CATEGORY_FILTERS.items():
+        values = [value.strip() for raw in args.getlist(name) for value in raw.split(',') if value.strip()]
+        if values:
+            filters.append(('category', column, values))
+
+    zone = args.get('hz')
+    if zone is not None:
+        if zone not in HABITABLE_ZONE_FLAGS:
+            raise QueryError(f"hz must be one of {', '.join(HABITABLE_ZONE_FLAGS)}")
+        filters.append(('category', HABITABLE_ZONE_FLAGS[zone], ['1']))
+    return filters
+
+
+_shared = {'frame': None, 'index': None}
+_shared_lock = threading.Lock()
+
+
+#The search index of the current catalog, rebuilt when a reload swaps the frame
+def get_search_index():
+    frame = get_star_index().frame
+    with _shared_lock:
+        if _shared['frame'] is not frame:
+            _shared['index'] = SearchIndex(frame)
+            _shared['frame'] = frame
+        return _shared['index']
+
+
+def init_app(app):
+
+    #/api/planets?habitable=1&esi_min=0.8&s_type=M*&hz=conservative&sort=esi&order=desc&offset=0&limit=50
+    @app.route('/api/planets')
+    def search_planets():
+        index = get_search_index()
+        try:
+            filters = parse_filters(request.args)
+            offset = request.args.get('offset', 0, type=int)
+            limit = min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT)
+            sort = request.args.get('sort')
+            if sort is not None and sort not in NUMERIC_FILTERS:
+                raise QueryError(f"sort must be one of {', '.join(NUMERIC_FILTERS)}")
+            if offset < 0 or limit < 1:
+                raise QueryError("offset must not be negative and limit must be positive")
+        except QueryError as e:
+            return {'error': str(e)}, 400
+
+        rows = index.rows(filters, sort=NUMERIC_FILTERS.get(sort), descending=request.args.get('order') == 'desc')
+        return {'total': int(len(rows)), 'offset': offset, 'limit': limit,
+                'results': index.records(rows[offset:offset + limit])}
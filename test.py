@@ -1,10 +1,24 @@
-##perfect without relative motion
+##relative motion from real periods and eccentricities (see ephemeris.py)
+import logging
+import time
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import plotly.graph_objs as go
-from scipy.spatial.transform import Rotation as R
+from plotly.offline import get_plotlyjs_version
+from geometry import (generate_orbits, generate_orbits_lod, generate_sphere, orbit_vertex_counts, pixels_per_unit,
+                      ra_dec_to_cartesian, segments_for_error, shell_mesh)
+from ephemeris import frame_times, fill_periods, planet_positions
+from catalog import display_values, get_catalog
+import fast_figure
+from instrumentation import Stopwatch, render_record
 
-df = pd.read_csv("hwc_3d_data.csv")
+# the catalog is loaded by whoever renders, not on import (render pool workers import
+# this module too)
+
+logger = logging.getLogger(__name__)
 
 exoplanet_colors = {
     "Kepler-62 b": "lightgray",
@@ -30,40 +44,10 @@ exoplanet_colors = {
 }
 
 
-#RA and DEC to Cartesian coordinates
-def ra_dec_to_cartesian(ra, dec, distance):
-    ra_rad = np.deg2rad(ra)
-    dec_rad = np.deg2rad(dec)
-    x = distance * np.cos(dec_rad) * np.cos(ra_rad)
-    y = distance * np.cos(dec_rad) * np.sin(ra_rad)
-    z = distance * np.sin(dec_rad)
-    return x, y, z
-
-
-#Generating orbits and apply inclination using a rotation matrix
-def generate_orbit(semi_major_axis, inclination, num_points=100):
-    angles = np.linspace(0, 2 * np.pi, num_points)
-    x_orbit = semi_major_axis * np.cos(angles)
-    y_orbit = semi_major_axis * np.sin(angles)
-    z_orbit = np.zeros_like(x_orbit)  # Initially in the xy-plane
-
-    # Apply inclination as a rotation around the x-axis
-    inclination_rotation = R.from_euler('x', inclination, degrees=True)
-    orbit_points = np.vstack((x_orbit, y_orbit, z_orbit)).T
-    rotated_orbit = inclination_rotation.apply(orbit_points)
-
-    return rotated_orbit[:, 0], rotated_orbit[:, 1], rotated_orbit[:, 2]
+#ra_dec_to_cartesian lives in geometry.py too, so galaxy.py can convert the whole catalog
+#without importing the plotting code
 
-
-#Generating sphere for habitable zones
-def generate_sphere(radius, num_points=50):
-    phi = np.linspace(0, np.pi, num_points)
-    theta = np.linspace(0, 2 * np.pi, num_points)
-    phi, theta = np.meshgrid(phi, theta)
-    x = radius * np.sin(phi) * np.cos(theta)
-    y = radius * np.sin(phi) * np.sin(theta)
-    z = radius * np.cos(phi)
-    return x, y, z
+#generate_orbit / generate_sphere now live in geometry.py (all orbits of a system at once: generate_orbits)
 
 # def add_glow_effect(x, y, z, radius, color):
 #     glow_trace = go.Surface(
@@ -79,73 +63,255 @@ def generate_sphere(radius, num_points=50):
 
 habitable_zones_visible = True  # Initialize visibility status
 
+# 'delta' frames only carry the moving planet traces (addressed by trace index),
+# 'full' frames re-embed every static trace as well (the original behaviour),
+# 'parametric' sends no frames at all, only the orbital elements of the planets, and
+# orbits.js moves the planet traces in the browser
+FRAME_MODES = ('delta', 'full', 'parametric')
 
+# milliseconds per animation frame; the parametric animation runs at the same speed
+FRAME_DURATION = 50
 
-def generate_plots(df):
-    star_systems = df.groupby('S_NAME')
-    plots_html = ""
-
-    for star_name, star_data in star_systems:
-        print(f"Creating map for star system: {star_name}")
+# run after Plotly.newPlot for parametric figures, orbits.js has to be on the page
+PARAMETRIC_SCRIPT = "ExoOrbits.animate(document.getElementById('{plot_id}'));"
 
-        ra = star_data['S_RA'].values[0]
-        dec = star_data['S_DEC'].values[0]
-        distance = star_data['S_DISTANCE'].values[0]
-        x_star, y_star, z_star = ra_dec_to_cartesian(ra, dec, distance)
-        star_radius = star_data['S_RADIUS'].values[0]
+# 'fast' assembles plain dicts with binary float32 arrays (fast_figure.py),
+# 'plotly' goes through graph_objects and fig.to_html / fig.to_json
+SERIALIZERS = ('fast', 'plotly')
 
-        static_traces = []
+# same plotly.js build that fig.to_html(include_plotlyjs='cdn') points at
+plotly_cdn_url = f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
 
-        star_trace = go.Scatter3d(
-            x=[x_star], y=[y_star], z=[z_star],
-            mode='markers',
-            marker=dict(size=star_radius * 10, color='yellow'),
-            name='Star'
-        )
-        static_traces.append(star_trace)
-        star_glow_trace = go.Surface(
-            x=generate_sphere(star_radius * 0.1)[0] + x_star,
-            y=generate_sphere(star_radius * 0.1)[1] + y_star,
-            z=generate_sphere(star_radius * 0.1)[2] + z_star,
-            opacity=0.1,  # Make it faint
-            colorscale=[[0, 'yellow'], [1, 'yellow']],  # Same color but faint
-            showscale=False,
-            name='Glow'
-        )
-
-        #star_glow_trace = add_glow_effect(x_star, y_star, z_star, star_radius, 'yellow')
-        static_traces.append(star_glow_trace)
-
-        orbit_traces = []
-        planet_orbits = []
-        planet_traces = []  # Added this line
-
-        for _, planet in star_data.iterrows():
-            semi_major_axis = planet['P_SEMI_MAJOR_AXIS']
-            inclination = planet['P_INCLINATION']
-            planet_radius = planet['P_RADIUS']
-            planet_name = planet['P_NAME']
-
-
-            x_orbit, y_orbit, z_orbit = generate_orbit(semi_major_axis, inclination)
-            x_orbit += x_star
-            y_orbit += y_star
-            z_orbit += z_star
+plot_config = {
+    'displayModeBar': True,
+    'modeBarButtonsToAdd': ['toggleSpikelines', 'resetViews'],
+    'displaylogo': False,
+    'scrollZoom': True,
+    'showTips': True
+}
 
-            planet_orbits.append((x_orbit, y_orbit, z_orbit, planet_radius, planet_name))
 
-            orbit_trace = go.Scatter3d(
-                x=x_orbit, y=y_orbit, z=z_orbit,
-                mode='lines',
-                line=dict(
-                    #color=f'rgb({np.random.randint(100, 255)},{np.random.randint(100, 255)},{np.random.randint(100, 255)})',
-                    color='white',
-                    width=2),
-                name=f'Orbit of {planet_name}'
-            )
-            orbit_traces.append(orbit_trace)
+# habitable zones as (name, inner radius column, outer radius column, color); the colors
+# are the middle of the Greens and Reds colorscales the old sphere surfaces used
+HABITABLE_ZONES = (
+    ('Optimistic Habitable Zone', 'S_HZ_OPT_MIN', 'S_HZ_OPT_MAX', 'rgb(65,171,93)'),
+    ('Conservative Habitable Zone', 'S_HZ_CON_MIN', 'S_HZ_CON_MAX', 'rgb(239,59,44)'),
+)
+
+
+#Everything that has to be computed for a star system before any trace is built:
+#star position, glow sphere, orbit lines, per-frame planet positions and habitable zones.
+#orbit_points=None picks vertex counts per orbit and sphere from the on-screen size of each
+#object in the system (geometry.orbit_vertex_counts / sphere_frequency); a number gives every
+#orbit that many points as before.
+def system_geometry(star_data, num_frames=100, orbit_points=None, time_span=None):
+    ra = star_data['S_RA'].values[0]
+    dec = star_data['S_DEC'].values[0]
+    distance = star_data['S_DISTANCE'].values[0]
+    x_star, y_star, z_star = ra_dec_to_cartesian(ra, dec, distance)
+    star_radius = star_data['S_RADIUS'].values[0]
+    star_center = (x_star, y_star, z_star)
+
+    # every orbit of the system in one batched call; the animation path comes from the
+    # ephemeris so planets move with their real periods along their elliptical orbits
+    semi_major_axes = star_data['P_SEMI_MAJOR_AXIS'].values
+    inclinations = star_data['P_INCLINATION'].values
+    eccentricities = star_data['P_ECCENTRICITY'].values
+    periods = fill_periods(semi_major_axes, star_data['P_PERIOD'].values)
+
+    # the system's extent fills the view (aspectmode='data'), which sets the screen scale
+    zones = [(name, star_data[inner].values[0], star_data[outer].values[0], color)
+             for name, inner, outer, color in HABITABLE_ZONES]
+    apoapses = semi_major_axes * (1 + np.nan_to_num(eccentricities))
+    extent = np.nanmax(np.concatenate([apoapses, [outer for _, _, outer, _ in zones], [star_radius * 0.1]]))
+    scale = pixels_per_unit(extent)
+
+    if orbit_points is None:
+        orbits = generate_orbits_lod(semi_major_axes, inclinations,
+                                     orbit_vertex_counts(semi_major_axes, eccentricities, scale),
+                                     centers=star_center, eccentricities=eccentricities)
+    else:
+        orbits = generate_orbits(semi_major_axes, inclinations, orbit_points,
+                                 centers=star_center, eccentricities=eccentricities)
+    if time_span is None:
+        time_span = np.nanmax(periods)
+    times = frame_times(periods, num_frames, time_span)
+    paths = planet_positions(semi_major_axes, eccentricities, inclinations, periods, times, centers=star_center)
+
+    glow_points = int(min(segments_for_error(star_radius * 0.1 * scale, min_segments=8) + 1, 50))
+
+    return {
+        'star_center': star_center,
+        'star_radius': star_radius,
+        'glow': generate_sphere(star_radius * 0.1, num_points=glow_points, center=star_center),
+        'orbits': orbits,
+        'paths': paths,
+        'hz': [dict(shell_mesh(inner, outer, scale, center=star_center), name=name, color=color)
+               for name, inner, outer, color in zones],
+        'planet_names': list(star_data['P_NAME'].values),
+        # hover card values, without float32 noise
+        'planet_radii': display_values(star_data['P_RADIUS'].values).tolist(),
+        'planet_mass': display_values(star_data['P_MASS'].values)[0].item(),
+        'num_frames': num_frames,
+        'elements': {'a': semi_major_axes, 'e': eccentricities, 'inc': inclinations, 'period': periods},
+        'time_span': time_span,
+    }
+
+
+#Orbital elements of the planets for the parametric animation (orbits.js), stored in
+#layout.meta; the planet traces are the last traces of the figure, in the same order.
+#The slowest planet completes an orbit in num_frames frames, as in the frame-based animation.
+def orbital_motion(geometry, num_frames=100):
+    elements = geometry['elements']
+
+    def finite(values):
+        return [float(v) if np.isfinite(v) else None for v in np.asarray(values, dtype=float)]
+
+    return {
+        'a': finite(elements['a']),
+        'e': np.nan_to_num(np.asarray(elements['e'], dtype=float)).tolist(),
+        'inc': finite(np.deg2rad(np.asarray(elements['inc'], dtype=float))),
+        'period': finite(elements['period']),
+        'center': [float(v) for v in geometry['star_center']],
+        'days_per_second': float(geometry['time_span']) / (num_frames * FRAME_DURATION / 1000),
+    }
+
+
+#motion (from orbital_motion) switches the Play/Pause buttons from frame animation to
+#the parametric one, which listens for them with plotly_buttonclicked
+def system_layout(star_name, motion=None):
+    layout = dict(
+        title=dict(text=f'Star System: {star_name}'),
+        scene=dict(
+            xaxis=dict(visible=False),
+            yaxis=dict(visible=False),
+            zaxis=dict(visible=False),
+            bgcolor='black',
+            aspectmode='data',
+        ),
+        paper_bgcolor='black',
+        plot_bgcolor='black',
+        updatemenus=[{
+            'buttons': [
+                {'args': [None, {'frame': {'duration': FRAME_DURATION, 'redraw': True}, 'fromcurrent': True, 'mode': 'immediate', 'loop': True}],
+                 'label': 'Play',
+                 'method': 'animate'},
+                {'args': [[None], {'frame': {'duration': 0, 'redraw': True}, 'mode': 'immediate',
+                                   'transition': {'duration': 0}}],
+                 'label': 'Pause',
+                 'method': 'animate'},
+                # {
+                #     'args': [initial_traces],
+                #     'label': 'Show Habitable Zones',
+                #     'method': 'update'
+                # },
+                # {
+                #     'args': [static_traces_without_hz + planet_traces],
+                #     'label': 'Hide Habitable Zones',
+                #     'method': 'update'
+                # }
+
+            ],
+            'type': 'buttons',
+            'showactive': False,
+            'x': 0.1,
+            'y': 0,
+            'xanchor': 'right',
+            'yanchor': 'top'
+        }],
+        margin=dict(l=0, r=0, b=0, t=30),
+    )
+    if motion is not None:
+        layout['updatemenus'][0]['buttons'] = [{'label': 'Play', 'method': 'skip'},
+                                               {'label': 'Pause', 'method': 'skip'}]
+        layout['meta'] = {'orbits': motion}
+    return layout
+
+
+#Building the animated figure of a single star system
+def generate_system_figure(star_name, star_data, frame_mode='delta', num_frames=100, orbit_points=None, time_span=None):
+    if frame_mode not in FRAME_MODES:
+        raise ValueError(f"Unknown frame mode {frame_mode!r}, expected one of {FRAME_MODES}")
+
+    parametric = frame_mode == 'parametric'
+    stopwatch = Stopwatch()
+    # the parametric animation only needs the starting positions
+    geometry = system_geometry(star_data, 1 if parametric else num_frames, orbit_points, time_span)
+    stopwatch.lap('geometry')
+    x_star, y_star, z_star = geometry['star_center']
+    star_radius = geometry['star_radius']
+
+    static_traces = []
+
+    star_trace = go.Scatter3d(
+        x=[x_star], y=[y_star], z=[z_star],
+        mode='markers',
+        marker=dict(size=star_radius * 10, color='yellow'),
+        name='Star'
+    )
+    static_traces.append(star_trace)
+    glow_x, glow_y, glow_z = geometry['glow']
+    star_glow_trace = go.Surface(
+        x=glow_x,
+        y=glow_y,
+        z=glow_z,
+        opacity=0.1,  # Make it faint
+        colorscale=[[0, 'yellow'], [1, 'yellow']],  # Same color but faint
+        showscale=False,
+        name='Glow'
+    )
+
+    #star_glow_trace = add_glow_effect(x_star, y_star, z_star, star_radius, 'yellow')
+    static_traces.append(star_glow_trace)
+
+    orbit_traces = []
+    planet_orbits = []
+    planet_traces = []  # Added this line
+
+    x_orbits, y_orbits, z_orbits = geometry['orbits']
+    x_paths, y_paths, z_paths = geometry['paths']
+
+    # the planet as it appears in the animation frames, with its label and hover card
+    def labelled_planet(x, y, z, planet_radius, planet_name):
+        return go.Scatter3d(
+            x=x, y=y, z=z,
+            mode='markers+text',
+            marker=dict(size=planet_radius * 10, color=exoplanet_colors.get(planet_name, 'cyan'), symbol='circle'),
+            textposition="top center",
+            name=planet_name,
+            text=planet_name,
+            hoverinfo='name',
+            customdata=[[planet_name, planet_radius, geometry['planet_mass']]],
+            hovertemplate=(
+                '<b>Name:</b> %{customdata[0]}<br>'
+                '<b>Radius:</b> %{customdata[1]}<br>'
+                '<b>Mass:</b> %{customdata[2]}<br>'
+                '<extra></extra>'
+            ),
+            textfont=dict(color='black')
+        )
 
-            # Add initial planet position
+    for p, (planet_radius, planet_name) in enumerate(zip(geometry['planet_radii'], geometry['planet_names'])):
+        x_orbit, y_orbit, z_orbit = x_orbits[p], y_orbits[p], z_orbits[p]
+        planet_orbits.append((x_paths[p], y_paths[p], z_paths[p], planet_radius, planet_name))
+
+        orbit_trace = go.Scatter3d(
+            x=x_orbit, y=y_orbit, z=z_orbit,
+            mode='lines',
+            line=dict(
+                #color=f'rgb({np.random.randint(100, 255)},{np.random.randint(100, 255)},{np.random.randint(100, 255)})',
+                color='white',
+                width=2),
+            name=f'Orbit of {planet_name}'
+        )
+        orbit_traces.append(orbit_trace)
+
+        # Add initial planet position
+        if parametric:
+            # no frame ever replaces this trace, orbits.js only moves it
+            planet_trace = labelled_planet([x_paths[p][0]], [y_paths[p][0]], [z_paths[p][0]], planet_radius,
+                                           planet_name)
+        else:
             planet_trace = go.Scatter3d(
                 x=[x_orbit[0]], y=[y_orbit[0]], z=[z_orbit[0]],
                 mode='markers',
@@ -154,144 +320,236 @@ def generate_plots(df):
                 hoverinfo='name'
             )
 
-            planet_traces.append(planet_trace)
-            #planet_glow_trace = add_glow_effect(x_orbit[0], y_orbit[0], z_orbit[0], planet_radius, 'cyan')
-            #static_traces.append(planet_glow_trace)
-
-        static_traces.extend(orbit_traces)
-
+        planet_traces.append(planet_trace)
+        #planet_glow_trace = add_glow_effect(x_orbit[0], y_orbit[0], z_orbit[0], planet_radius, 'cyan')
+        #static_traces.append(planet_glow_trace)
 
-        hz_opt_max = star_data['S_HZ_OPT_MAX'].values[0]
-        hz_con_max = star_data['S_HZ_CON_MAX'].values[0]
+    static_traces.extend(orbit_traces)
 
-        hz_opt_x, hz_opt_y, hz_opt_z = generate_sphere(hz_opt_max)
-        hz_con_x, hz_con_y, hz_con_z = generate_sphere(hz_con_max)
-
-        hz_opt_trace = go.Surface(
-            x=hz_opt_x + x_star, y=hz_opt_y + y_star, z=hz_opt_z + z_star,
+    # habitable zones as inner/outer shells, one Mesh3d each
+    for zone in geometry['hz']:
+        static_traces.append(go.Mesh3d(
+            x=zone['x'], y=zone['y'], z=zone['z'],
+            i=zone['i'], j=zone['j'], k=zone['k'],
+            color=zone['color'],
             opacity=0.2,
-            colorscale='Greens',
-            showscale=False,
-            name='Optimistic Habitable Zone',
+            name=zone['name'],
             visible=True,
             hoverinfo="none"
-        )
-        hz_con_trace = go.Surface(
-            x=hz_con_x + x_star, y=hz_con_y + y_star, z=hz_con_z + z_star,
-            opacity=0.2,
-            colorscale='Reds',
-            showscale=False,
-            name='Conservative Habitable Zone',
-            visible=True,
-            hoverinfo="none"
-        )
-        static_traces.extend([hz_opt_trace, hz_con_trace])
-
-        # static_traces_with_hz = static_traces.copy()
-        # static_traces_with_hz.extend([hz_opt_trace, hz_con_trace])
-        # static_traces_without_hz = static_traces.copy()
-        # initial_traces = static_traces_with_hz + planet_traces
-
-        frames = []
-        num_frames = len(planet_orbits[0][0])
-
-        for i in range(num_frames):
-            frame_data = list(static_traces)
-            frame_planets = []
-            planet_glow_trace = [] #added a new list for planet glow trace
-
-            for x_orbit, y_orbit, z_orbit, planet_radius, planet_name in planet_orbits:
-
-                planet_trace = go.Scatter3d(
-                    x=[x_orbit[i]], y=[y_orbit[i]], z=[z_orbit[i]],
-                    mode='markers+text',
-                    marker=dict(size=planet_radius * 10, color=exoplanet_colors.get(planet_name, 'cyan'), symbol='circle'),
-                    textposition="top center",
-                    name=planet_name,
-                    text=planet_name,
-                    hoverinfo='name',
-                    customdata=[[planet_name, planet_radius, star_data['P_MASS'].values[0]]],
-                    hovertemplate=(
-                        '<b>Name:</b> %{customdata[0]}<br>'
-                        '<b>Radius:</b> %{customdata[1]}<br>'
-                        '<b>Mass:</b> %{customdata[2]}<br>'
-                        '<extra></extra>'
-                    ),
-                    textfont=dict(color='black')
-                )
-                frame_planets.append(planet_trace)
-
-                # glow_trace = go.Surface(
-                #     x=generate_sphere(planet_radius * 0.1)[0] + x_orbit[i],
-                #     y=generate_sphere(planet_radius * 0.1)[1] + y_orbit[i],
-                #     z=generate_sphere(planet_radius * 0.1)[2] + z_orbit[i],
-                #     opacity=0.1,  # Make it faint
-                #     colorscale=[[0, 'cyan'], [1, 'cyan']],  # Same color but faint
-                #     showscale=False,
-                #     name='Glow'
-                # )
-                # planet_glow_trace.append(glow_trace)
-
-            frame_data.extend(frame_planets)
-            #frame_data.extend(planet_glow_trace)
+        ))
+
+    # static_traces_with_hz = static_traces.copy()
+    # static_traces_with_hz.extend([hz_opt_trace, hz_con_trace])
+    # static_traces_without_hz = static_traces.copy()
+    # initial_traces = static_traces_with_hz + planet_traces
+
+    stopwatch.lap('traces')
+    frames = []
+    # planet traces sit after the static ones in fig.data
+    planet_indices = list(range(len(static_traces), len(static_traces) + len(planet_traces)))
+
+    if parametric:
+        layout = go.Layout(system_layout(star_name, orbital_motion(geometry, num_frames)))
+        fig = go.Figure(data=static_traces + planet_traces, layout=layout)
+        stopwatch.lap('frames')
+        return fig
+
+    for i in range(num_frames):
+        frame_data = list(static_traces) if frame_mode == 'full' else []
+        frame_planets = []
+        planet_glow_trace = [] #added a new list for planet glow trace
+
+        for x_orbit, y_orbit, z_orbit, planet_radius, planet_name in planet_orbits:
+
+            planet_trace = labelled_planet([x_orbit[i]], [y_orbit[i]], [z_orbit[i]], planet_radius, planet_name)
+            frame_planets.append(planet_trace)
+
+            # glow_trace = go.Surface(
+            #     x=generate_sphere(planet_radius * 0.1)[0] + x_orbit[i],
+            #     y=generate_sphere(planet_radius * 0.1)[1] + y_orbit[i],
+            #     z=generate_sphere(planet_radius * 0.1)[2] + z_orbit[i],
+            #     opacity=0.1,  # Make it faint
+            #     colorscale=[[0, 'cyan'], [1, 'cyan']],  # Same color but faint
+            #     showscale=False,
+            #     name='Glow'
+            # )
+            # planet_glow_trace.append(glow_trace)
+
+        frame_data.extend(frame_planets)
+        #frame_data.extend(planet_glow_trace)
+        if frame_mode == 'full':
             frames.append(go.Frame(data=frame_data, name=f'frame_{i}'))
+        else:
+            frames.append(go.Frame(data=frame_data, traces=planet_indices, name=f'frame_{i}'))
+
+    frames.append(frames[0])
+
+    layout = go.Layout(system_layout(star_name))
+
+    fig = go.Figure(data=static_traces+planet_traces, frames=frames, layout=layout)
+    stopwatch.lap('frames')
+
+    #print(static_traces)
+
+    return fig
+
+
+def _system_figure_dict(star_name, star_data, frame_mode, num_frames, orbit_points=None):
+    parametric = frame_mode == 'parametric'
+    stopwatch = Stopwatch()
+    geometry = system_geometry(star_data, 1 if parametric else num_frames, orbit_points)
+    stopwatch.lap('geometry')
+    layout = system_layout(star_name, orbital_motion(geometry, num_frames) if parametric else None)
+    return fast_figure.system_figure_dict(star_name, geometry, layout, exoplanet_colors, frame_mode=frame_mode)
+
+
+def _check_serializer(serializer):
+    if serializer not in SERIALIZERS:
+        raise ValueError(f"Unknown serializer {serializer!r}, expected one of {SERIALIZERS}")
+
+
+#Rendering one star system to an HTML snippet, going through the figure cache when one is given
+def generate_system_html(star_name, star_data, frame_mode='delta', num_frames=100, orbit_points=None, cache=None,
+                         serializer='fast'):
+    _check_serializer(serializer)
+    params = dict(frame_mode=frame_mode, num_frames=num_frames, orbit_points=orbit_points)
+
+    post_script = PARAMETRIC_SCRIPT if frame_mode == 'parametric' else None
+
+    def build():
+        logger.debug("Creating map for star system: %s", star_name)
+        with render_record(star_name, 'html') as record:
+            if serializer == 'fast':
+                fig = _system_figure_dict(star_name, star_data, **params)
+                stopwatch = Stopwatch()
+                html = fast_figure.figure_to_html(fig, plot_config, plotly_cdn_url, post_script=post_script)
+            else:
+                fig = generate_system_figure(star_name, star_data, **params)
+                stopwatch = Stopwatch()
+                html = fig.to_html(full_html=False, include_plotlyjs='cdn', config=plot_config,
+                                   post_script=post_script)
+            stopwatch.lap('serialize')
+            record['bytes'] = len(html)
+        return html
+
+    if cache is None:
+        return build()
+    return cache.get_or_create(cache.make_key(star_name, star_data, kind='html', serializer=serializer, **params),
+                               build, name=star_name)
+
+
+#Figure JSON of one star system for pages that draw it with Plotly.newPlot themselves
+def generate_system_json(star_name, star_data, frame_mode='delta', num_frames=100, orbit_points=None, cache=None,
+                         serializer='fast'):
+    _check_serializer(serializer)
+    params = dict(frame_mode=frame_mode, num_frames=num_frames, orbit_points=orbit_points)
+
+    def build():
+        logger.debug("Creating figure JSON for star system: %s", star_name)
+        with render_record(star_name, 'json') as record:
+            if serializer == 'fast':
+                fig = _system_figure_dict(star_name, star_data, **params)
+                stopwatch = Stopwatch()
+                figure_json = fast_figure.dumps(fig)
+            else:
+                fig = generate_system_figure(star_name, star_data, **params)
+                stopwatch = Stopwatch()
+                figure_json = fig.to_json()
+            stopwatch.lap('serialize')
+            record['bytes'] = len(figure_json)
+        return figure_json
+
+    if cache is None:
+        return build()
+    return cache.get_or_create(cache.make_key(star_name, star_data, kind='json', serializer=serializer, **params),
+                               build, name=star_name)
+
+
+#Process pool shared by every parallel render, created on first use.
+#Workers are spawned rather than forked so they never inherit the web server's threads.
+_render_pool = None
+_render_pool_workers = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool(workers):
+    global _render_pool, _render_pool_workers
+    with _render_pool_lock:
+        if _render_pool is None or _render_pool_workers != workers:
+            if _render_pool is not None:
+                _render_pool.shutdown(wait=False)
+            _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _render_pool_workers = workers
+        return _render_pool
+
+
+def _render_system_job(job):
+    star_name, star_data, params = job
+    return generate_system_html(star_name, star_data, **params)
+
+
+#Building and serializing systems in worker processes. Cached systems are answered in
+#this process, only the misses go to the pool, and results come back in input order.
+def _iter_plots_parallel(star_systems, params, cache, workers, chunksize):
+    keys = [cache.make_key(name, data, kind='html', **params) if cache is not None else None
+            for name, data in star_systems]
+    cached = [cache.get(key) if cache is not None else None for key in keys]
+    jobs = [(name, data, params) for (name, data), html in zip(star_systems, cached) if html is None]
+    results = get_render_pool(workers).map(_render_system_job, jobs, chunksize=chunksize)
+
+    for (name, _), key, html in zip(star_systems, keys, cached):
+        if html is None:
+            html = next(results)
+            if cache is not None:
+                cache.put(key, html, name=name)
+        yield html
+
+
+#Yielding one rendered star system at a time so callers can stream them out;
+#star_index (a catalog.StarIndex over df) skips regrouping the frame on every call.
+#workers > 1 farms the systems out to a process pool once there are at least
+#min_parallel of them, smaller inputs are cheaper to render serially.
+def iter_plots(df, frame_mode='delta', num_frames=100, orbit_points=None, cache=None, star_index=None,
+               workers=None, chunksize=1, min_parallel=4, serializer='fast'):
+    if star_index is not None:
+        star_systems = star_index.partitions()
+    else:
+        star_systems = df.groupby('S_NAME', observed=True)
+    params = dict(frame_mode=frame_mode, num_frames=num_frames, orbit_points=orbit_points, serializer=serializer)
+
+    if workers is not None and workers > 1:
+        star_systems = list(star_systems)
+        if len(star_systems) >= min_parallel:
+            yield from _iter_plots_parallel(star_systems, params, cache, workers, chunksize)
+            return
 
-        frames.append(frames[0])
-
-        layout = go.Layout(
-            title=f'Star System: {star_name}',
-            scene=dict(
-                xaxis=dict(visible=False),
-                yaxis=dict(visible=False),
-                zaxis=dict(visible=False),
-                bgcolor='black',
-                aspectmode='data',
-            ),
-            paper_bgcolor='black',
-            plot_bgcolor='black',
-            updatemenus=[{
-                'buttons': [
-                    {'args': [None, {'frame': {'duration': 50, 'redraw': True}, 'fromcurrent': True, 'mode': 'immediate', 'loop': True}],
-                     'label': 'Play',
-                     'method': 'animate'},
-                    {'args': [[None], {'frame': {'duration': 0, 'redraw': True}, 'mode': 'immediate',
-                                       'transition': {'duration': 0}}],
-                     'label': 'Pause',
-                     'method': 'animate'},
-                    # {
-                    #     'args': [initial_traces],
-                    #     'label': 'Show Habitable Zones',
-                    #     'method': 'update'
-                    # },
-                    # {
-                    #     'args': [static_traces_without_hz + planet_traces],
-                    #     'label': 'Hide Habitable Zones',
-                    #     'method': 'update'
-                    # }
-
-                ],
-                'type': 'buttons',
-                'showactive': False,
-                'x': 0.1,
-                'y': 0,
-                'xanchor': 'right',
-                'yanchor': 'top'
-            }],
-            margin=dict(l=0, r=0, b=0, t=30),
-        )
-
-        config = {
-            'displayModeBar': True,
-            'modeBarButtonsToAdd': ['toggleSpikelines', 'resetViews'],
-            'displaylogo': False,
-            'scrollZoom': True,
-            'showTips': True
-        }
-
-        fig = go.Figure(data=static_traces+planet_traces, frames=frames, layout=layout)
-        plots_html += fig.to_html(full_html=False, include_plotlyjs='cdn', config=config)
-
-        #print(static_traces)
-
-
-    return plots_html
+    for star_name, star_data in star_systems:
+        yield generate_system_html(star_name, star_data, cache=cache, **params)
+
+
+def generate_plots(df, frame_mode='delta', num_frames=100, orbit_points=None, cache=None, star_index=None,
+                   workers=None, chunksize=1, min_parallel=4, serializer='fast'):
+    return "".join(iter_plots(df, frame_mode=frame_mode, num_frames=num_frames, orbit_points=orbit_points,
+                              cache=cache, star_index=star_index, workers=workers, chunksize=chunksize,
+                              min_parallel=min_parallel, serializer=serializer))
+
+
+#Before/after payload and serialization cost of the two frame modes
+def frame_size_report(df):
+    report = []
+    for star_name, star_data in df.groupby('S_NAME', observed=True):
+        row = {'S_NAME': star_name}
+        for frame_mode in FRAME_MODES:
+            fig = generate_system_figure(star_name, star_data, frame_mode=frame_mode)
+            start = time.perf_counter()
+            html = fig.to_html(full_html=False, include_plotlyjs='cdn', config=plot_config)
+            row[f'{frame_mode}_bytes'] = len(html.encode('utf-8'))
+            row[f'{frame_mode}_seconds'] = time.perf_counter() - start
+        row['size_ratio'] = row['full_bytes'] / row['delta_bytes']
+        report.append(row)
+    return pd.DataFrame(report)
+
+
+if __name__ == '__main__':
+    pd.set_option('display.width', 160)
+    print(frame_size_report(get_catalog()))
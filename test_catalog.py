@@ -0,0 +1,54 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from catalog import STAR_COLUMNS, StarIndex, display_values, system_digests
+from figure_cache import FigureCache
+
+
+#The per-system digests come from one hash of the whole frame; they must match hashing
+#each system's rows on their own
+def test_system_digests_match_hashing_each_system(frame):
+    star_index = StarIndex(frame)
+    digests = system_digests(star_index)
+    assert len(digests) == len(star_index)
+    for system in star_index.systems:
+        alone = pd.util.hash_pandas_object(star_index.rows(system), index=False).to_numpy()
+        assert digests[system.name] == hashlib.sha1(alone.tobytes()).hexdigest(), system.name
+
+
+def test_figure_cache_key_with_index_row_hashes(frame):
+    star_index = StarIndex(frame)
+    for system in star_index.systems[:50]:
+        rows = star_index.rows(system)
+        assert (FigureCache.make_key(system.name, rows, row_hashes=star_index.row_hashes(system), kind='html')
+                == FigureCache.make_key(system.name, rows, kind='html'))
+
+
+#Displayed float32 values are the decimals NumPy prints for them, read back as float64
+def test_display_values_match_printed_float32(frame):
+    for column, dtype in frame.dtypes.items():
+        if dtype == np.float32:
+            values = frame[column].to_numpy()
+            assert np.array_equal(display_values(values), values.astype(str).astype(float), equal_nan=True), column
+
+
+def test_display_values_drop_float32_noise():
+    values = np.array([1.07, 12.429889, 1.116, 0.0553, 3.4e38, 1e-40, 0.0, -2.5, np.nan], dtype=np.float32)
+    shown = display_values(values)
+    assert shown.dtype == np.float64
+    assert shown[:-1].tolist() == [1.07, 12.429889, 1.116, 0.0553, 3.4e38, 1e-40, 0.0, -2.5]
+    assert np.isnan(shown[-1])
+    assert display_values(np.array([1.0700000524520874])).tolist() == [1.0700000524520874]
+
+
+#Star info shows 12.42989, not the widened 12.429888725280762
+def test_star_info_has_no_float32_noise(frame):
+    star_index = StarIndex(frame)
+    columns = [column for column in STAR_COLUMNS if frame[column].dtype == np.float32]
+    for system in star_index.systems[:50]:
+        for column in columns:
+            value = frame[column].to_numpy()[system.start]
+            if not np.isnan(value):
+                assert repr(system.info[column]) == str(value), (system.name, column)
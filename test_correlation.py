@@ -0,0 +1,66 @@
+import numpy as np
+
+from catalog import StarIndex, appended_rows
+import correlation
+from correlation import StreamingCorrelation, shared_correlation
+from dash_app import FigureStore, prepare_dataset
+
+COLUMNS = ["P_MASS", "P_RADIUS", "P_TEMP_EQUIL", "P_ESI", "P_HABITABLE"]
+
+
+#Largest difference to DataFrame.corr(); both must be missing in the same places
+def corr_difference(stats, dataset):
+    r = stats.matrix().to_numpy()
+    exact = dataset[COLUMNS].astype(float).corr().to_numpy()
+    assert np.array_equal(np.isnan(r), np.isnan(exact))
+    return np.nanmax(np.abs(r - exact), initial=0.0)
+
+
+def test_streaming_correlation_matches_corr(frame):
+    dataset = prepare_dataset(frame)
+    assert corr_difference(StreamingCorrelation.from_frame(dataset, COLUMNS), dataset) < 1e-9
+
+
+def test_streaming_correlation_in_batches(frame):
+    dataset = prepare_dataset(frame)
+    half = len(dataset) // 2
+    stats = StreamingCorrelation.from_frame(dataset.iloc[:half], COLUMNS).update(dataset.iloc[half:])
+    assert corr_difference(stats, dataset) < 1e-9
+
+
+#A reload that only appended rows is folded in from the old accumulator
+def test_appended_rows_folded_in(frame):
+    dropped = np.sort(np.random.default_rng(3).choice(len(frame), len(frame) // 10, replace=False))
+    old = frame.drop(index=dropped).reset_index(drop=True)
+    added = appended_rows(StarIndex(old), StarIndex(frame))
+    assert added is not None and np.array_equal(added, dropped)
+
+    dataset = prepare_dataset(frame)
+    previous = StreamingCorrelation.from_frame(prepare_dataset(old), COLUMNS)
+    folded = previous.copy().update(dataset.iloc[added])
+    assert corr_difference(folded, dataset) < 1e-9
+    # the copy leaves the old frame's sums alone
+    assert previous.rows == len(old)
+
+
+def test_modified_row_is_not_an_append(frame):
+    modified = frame.copy()
+    modified.loc[0, 'P_MASS'] = np.nan_to_num(modified.loc[0, 'P_MASS']) + 1
+    assert appended_rows(StarIndex(frame), StarIndex(modified)) is None
+
+
+#FigureStore.reload carries the shared accumulator over to the new dataset after an append
+def test_figure_store_reload_carries_correlation_over(frame):
+    old = frame.iloc[:len(frame) - len(frame) // 10].reset_index(drop=True)
+    indexes = [StarIndex(old)]
+    store = FigureStore(load=lambda: indexes[-1])
+    old_dataset = store._current()[1]
+    before = shared_correlation(old_dataset, COLUMNS)
+
+    indexes.append(StarIndex(frame))
+    store.reload(indexes[-1])
+    dataset = store._current()[1]
+    source, stats = correlation._shared[tuple(COLUMNS)]
+    assert source is dataset and stats is not before
+    assert stats.rows == len(frame)
+    assert corr_difference(shared_correlation(dataset, COLUMNS), dataset) < 1e-9
@@ -0,0 +1,43 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from dash_app import CLIENT_OPTIONS, FIGURE_BUILDERS, client_dataset, prepare_dataset
+from vis import app
+
+DASHBOARD_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'dashboard.js')
+CLIENTSIDE = {'habitability_scatter': 'habitabilityScatter', 'additional_scatter': 'additionalScatter',
+              'histogram': 'histogram', 'boxplot': 'boxplot', 'barchart': 'barchart'}
+
+
+#The browser-side dashboard is opt-in
+def test_dashboard_mode_defaults_to_server():
+    assert app.config['DASHBOARD_MODE'] == 'server'
+
+
+#Unknown dropdown values build nothing (the callback raises PreventUpdate)
+@pytest.mark.parametrize('chart', sorted(CLIENT_OPTIONS))
+def test_server_builders_reject_unknown_options(frame, chart):
+    dataset = prepare_dataset(frame)
+    assert FIGURE_BUILDERS[chart](dataset, 'no_such_option') is None
+
+
+#... and leave the chart as it is in the browser too
+@pytest.mark.skipif(shutil.which('node') is None, reason="needs node to run assets/dashboard.js")
+def test_clientside_rejects_unknown_options(frame):
+    data = client_dataset(prepare_dataset(frame))
+    assert data['options'] == CLIENT_OPTIONS
+    script = (
+        "global.window = {};"
+        f"require({json.dumps(DASHBOARD_JS)});"
+        "window.dash_clientside.no_update = 'no_update';"
+        "const [names, data] = JSON.parse(require('fs').readFileSync(0, 'utf8'));"
+        "console.log(JSON.stringify(names.map((name) => window.dash_clientside.exoplanets[name]('no_such_option', data))));"
+    )
+    names = [CLIENTSIDE[chart] for chart in sorted(CLIENT_OPTIONS)]
+    result = subprocess.run(['node', '-e', script], input=json.dumps([names, {'options': data['options']}]),
+                            capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == ['no_update'] * len(names)
@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from catalog import StarIndex
+from ephemeris import frame_times, kepler_anomalies, planet_positions, solve_kepler
+from test import orbital_motion, system_geometry
+
+ORBITS_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'orbits.js')
+
+
+@pytest.fixture
+def eccentricities(frame):
+    return np.clip(np.nan_to_num(frame['P_ECCENTRICITY'].to_numpy(dtype=float)), 0, 0.99)
+
+
+#E - e sin(E) = M to the solver's tolerance, for mean anomalies far outside [0, 2pi)
+@pytest.mark.parametrize('dtype, limit', [(np.float64, 1e-12), (np.float32, 1e-5)])
+def test_kepler_residual(eccentricities, dtype, limit):
+    e = eccentricities[:, None]
+    M = np.random.default_rng(1).uniform(-20 * np.pi, 20 * np.pi, (len(e), 16))
+    E, sin_E, cos_E = (v.astype(float) for v in kepler_anomalies(M.astype(dtype), e.astype(dtype)))
+    residual = np.abs(E - e * np.sin(E) - np.mod(M, 2 * np.pi))
+    assert np.minimum(residual, 2 * np.pi - residual).max() < limit
+    # sin and cos come from the last iteration, corrected for its step
+    assert np.abs(sin_E - np.sin(E)).max() < limit
+    assert np.abs(cos_E - np.cos(E)).max() < limit
+
+
+def test_solve_kepler_keeps_shape_and_dtype():
+    M = np.linspace(0, 2 * np.pi, 12, dtype=np.float32).reshape(3, 4)
+    E = solve_kepler(M, np.array([[0.0], [0.5], [0.9]]))
+    assert E.shape == (3, 4) and E.dtype == np.float32
+    assert np.allclose(solve_kepler(M[0].astype(float), 0.0), np.mod(M[0], 2 * np.pi), atol=1e-6)
+
+
+#float32 positions (the default) stay within plotting precision of float64, also for
+#planets that go round thousands of times in the span of the slowest orbit
+def test_float32_positions_match_float64(frame, eccentricities):
+    a = frame['P_SEMI_MAJOR_AXIS'].to_numpy(dtype=float)[:100]
+    inc = frame['P_INCLINATION'].to_numpy(dtype=float)[:100]
+    periods = frame['P_PERIOD'].to_numpy(dtype=float)[:100]
+    e = eccentricities[:100]
+    times = frame_times(periods)
+    exact = planet_positions(a, e, inc, periods, times, dtype=np.float64)
+    fast = planet_positions(a, e, inc, periods, times)
+    assert fast[0].dtype == np.float32
+    for f, x in zip(fast, exact):
+        assert np.nanmax(np.abs(f - x) / a[:, None]) < 1e-4
+
+
+#orbits.js positions for every planet of motion (test.orbital_motion) at each time
+def orbits_js_positions(motion, times):
+    script = (
+        "global.window = {};"
+        f"require({json.dumps(ORBITS_JS)});"
+        "const [orbits, times] = JSON.parse(require('fs').readFileSync(0, 'utf8'));"
+        "console.log(JSON.stringify(orbits.a.map((a, p) => times.map("
+        "    (t) => window.ExoOrbits.position(orbits, p, t)))));"
+    )
+    result = subprocess.run(['node', '-e', script], input=json.dumps([motion, list(times)]),
+                            capture_output=True, text=True, check=True)
+    return np.moveaxis(np.array(json.loads(result.stdout), dtype=float), 2, 0)
+
+
+#The browser animation of parametric figures (orbits.js, double precision Newton) and
+#the server side frames (planet_positions, Halley) put the planets in the same places
+@pytest.mark.skipif(shutil.which('node') is None, reason="needs node to run orbits.js")
+def test_orbits_js_matches_planet_positions(frame):
+    star_index = StarIndex(frame)
+    for system in star_index.systems[:20]:
+        geometry = system_geometry(star_index.rows(system), num_frames=16)
+        elements = geometry['elements']
+        times = frame_times(elements['period'], 16, geometry['time_span'])
+        js = orbits_js_positions(orbital_motion(geometry, 16), times)
+        a = np.asarray(elements['a'], dtype=float)[:, None]
+
+        exact = np.array(planet_positions(elements['a'], elements['e'], elements['inc'], elements['period'], times,
+                                          centers=geometry['star_center'], dtype=np.float64))
+        assert np.nanmax(np.abs(js - exact) / a) < 1e-8, system.name
+        # the default float32 frames differ by float32 rounding of the star's position
+        scale = a + np.abs(np.asarray(geometry['star_center'])).max()
+        assert np.nanmax(np.abs(js - np.array(geometry['paths'])) / scale) < 1e-5, system.name
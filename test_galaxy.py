@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from catalog import CATALOG_PATH, StarIndex, apply_schema
+from galaxy import GalaxyIndex
+from vis import app
+
+
+def test_habitable_counts_count_planets(frame):
+    galaxy = GalaxyIndex(StarIndex(frame))
+    habitable = frame['P_HABITABLE'].to_numpy()
+    for system, count in zip(galaxy.systems, galaxy.habitable_counts):
+        assert count == np.count_nonzero(habitable[system.start:system.stop] > 0), system.name
+
+
+#Kepler-62 e is class 2 (optimistic) and f class 1: two habitable planets, not three
+def test_kepler_62_has_two_habitable_planets():
+    galaxy = GalaxyIndex(StarIndex(apply_schema(pd.read_csv(CATALOG_PATH))))
+    row = [system.name for system in galaxy.systems].index('Kepler-62')
+    assert galaxy.habitable_counts[row] == 2
+    with app.test_request_context():
+        hover = galaxy._figure()['data'][0]['text'][row]
+    assert '2 habitable' in hover
@@ -0,0 +1,72 @@
+import fnmatch
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import search
+from search import QueryError, SearchIndex, parse_filters
+
+
+#Rows a query should find, filtering and sorting the frame directly (bounds compared at
+#the precision of the column, as SearchIndex does)
+def expected_rows(frame, numeric, categories, sort, descending):
+    expected = np.ones(len(frame), dtype=bool)
+    for name, (lo, hi) in numeric.items():
+        values = frame[search.NUMERIC_FILTERS[name]].to_numpy()
+        expected &= (values >= values.dtype.type(lo)) & (values <= values.dtype.type(hi))
+    for name, pattern in categories.items():
+        column = frame[search.CATEGORY_FILTERS[name]]
+        expected &= column.astype(str).map(lambda value: fnmatch.fnmatchcase(value, pattern)).to_numpy(dtype=bool) \
+            & column.notna().to_numpy()
+    matches = np.flatnonzero(expected)
+    if sort is None:
+        return matches
+    values = frame[search.NUMERIC_FILTERS[sort]].to_numpy()[matches]
+    present = ~np.isnan(values)
+    ordered = matches[present][np.argsort(values[present], kind='stable')]
+    return np.concatenate([ordered[::-1] if descending else ordered, matches[~present]])
+
+
+#Random compound queries: numeric ranges, flag and (wildcard) category filters, sorting
+def test_search_matches_direct_filtering(frame):
+    finder = SearchIndex(frame)
+    rng = np.random.default_rng(4)
+    for _ in range(100):
+        numeric = {}
+        for name in rng.choice(list(search.NUMERIC_FILTERS), rng.integers(0, 3), replace=False):
+            values = frame[search.NUMERIC_FILTERS[name]].to_numpy()
+            values = values[~np.isnan(values)]
+            if len(values):
+                numeric[str(name)] = np.sort(rng.choice(values, 2)).astype(float).tolist()
+        categories = {}
+        for name in rng.choice(list(search.CATEGORY_FILTERS), rng.integers(0, 3), replace=False):
+            labels = frame[search.CATEGORY_FILTERS[name]].dropna().astype(str).unique()
+            if len(labels):
+                label = str(rng.choice(labels))
+                categories[str(name)] = label[0] + '*' if rng.random() < 0.5 else label
+        sort = rng.choice([None] + list(search.NUMERIC_FILTERS))
+        descending = bool(rng.random() < 0.5)
+
+        args = MultiDict(list(categories.items()))
+        for name, (lo, hi) in numeric.items():
+            args.add(f'{name}_min', repr(lo))
+            args.add(f'{name}_max', repr(hi))
+        found = finder.rows(parse_filters(args), sort=search.NUMERIC_FILTERS.get(sort), descending=descending)
+        assert np.array_equal(found, expected_rows(frame, numeric, categories, sort, descending)), \
+            (args.to_dict(flat=False), sort, descending)
+
+
+#P_HABITABLE is 2 for the optimistic habitable zone, which is a value of its own
+def test_search_habitable_class_two(frame):
+    finder = SearchIndex(frame)
+    found = finder.rows(parse_filters(MultiDict([('habitable', '2')])))
+    assert np.array_equal(found, np.flatnonzero(frame['P_HABITABLE'].to_numpy() == 2))
+    found = finder.rows(parse_filters(MultiDict([('habitable', '1,2')])))
+    assert np.array_equal(found, np.flatnonzero(frame['P_HABITABLE'].to_numpy() > 0))
+
+
+@pytest.mark.parametrize('args', [{'esi_min': 'high'}, {'esi_max': 'nan'}, {'hz': 'wide'}])
+def test_parse_filters_rejects(args):
+    with pytest.raises(QueryError):
+        parse_filters(MultiDict(args))
@@ -1,39 +1,144 @@
-from flask import Flask, render_template
-import pandas as pd
-from test8 import generate_plots  # Importing all the plotting functions
-from dash_app import create_dash_app #importing the dash_app.py file
+from flask import Flask, Response, render_template, request, stream_template
+import catalog
+from catalog import get_star_index
+from test import FRAME_MODES, generate_plots, generate_system_html, generate_system_json, iter_plots, plot_config, plotly_cdn_url  # Importing all the plotting functions
+from figure_cache import FigureCache
+import galaxy
+import http_cache
+import instrumentation
+from lazy_dash import LazyDashboard
+import prerender
+import search
 
 app = Flask(__name__)
+# how / shows the figures: 'lazy' lists the systems and fetches each figure JSON when it
+# scrolls into view, 'stream' sends the rendered figures one system at a time and
+# 'inline' renders them all before responding (overridable per request with ?mode=)
+app.config.setdefault('INDEX_MODE', 'lazy')
+# worker processes for building the all-systems page, None renders serially
+app.config.setdefault('RENDER_WORKERS', None)
+# 'server' rebuilds (or looks up) a figure on the server for every dropdown change,
+# 'client' ships the dashboard data once and switches charts in the browser
+app.config.setdefault('DASHBOARD_MODE', 'server')
+# seconds between checks of the catalog CSV for changes, None turns hot reload off
+app.config.setdefault('CATALOG_WATCH_INTERVAL', 2.0)
 
-dash_app = create_dash_app(app)
+# stage timings, /metrics and the ?profile=1 toggle (PROFILING); registered first so
+# the timing also covers pages answered from the pre-rendered directory
+instrumentation.init_app(app)
 
-df = pd.read_csv("hwc_3d_data.csv")
+# pages written by `python prerender.py` are served straight from disk when present
+prerender.init_app(app)
+
+# ETags, 304s, compression and immutable static files; after prerender, whose files
+# bring their own ETags and encodings
+http_cache.init_app(app)
+
+# /galaxy overview of every host star and the /api/galaxy/nearby spatial queries
+galaxy.init_app(app, plot_config, plotly_cdn_url)
+
+# /api/planets, indexed search over the planet columns
+search.init_app(app)
+
+
+# The dashboard runs on a Flask server of its own, built on the first request to
+# /dashboard/ so importing this module does not import Dash (and build its figures).
+# It gets the same timing and caching hooks; its copy of the /metrics routes is never
+# reached, the registry behind them is shared anyway.
+def build_dashboard():
+    from dash_app import create_dash_app  #importing the dash_app.py file
+
+    server = Flask(__name__)
+    server.config.update(app.config)
+    instrumentation.init_app(server)
+    http_cache.init_app(server)
+    create_dash_app(server, mode=app.config['DASHBOARD_MODE'])
+    return server
+
+
+dashboard = LazyDashboard(app, '/dashboard/', build_dashboard)
+
+# Rendered figures only depend on the rows of a system and the render parameters,
+# so repeat page views are served from here instead of being rebuilt
+figure_cache = FigureCache(max_bytes=256 * 1024 * 1024, disk_dir=None)
+
+
+# the catalog can be swapped under a running app (see catalog.CatalogWatcher), so
+# routes look up the current frame and index on every request
+@catalog.subscribe
+def on_catalog_reload(changed, frame, star_index):
+    figure_cache.discard(changed)
+
+
+@instrumentation.REGISTRY.register_collector
+def figure_cache_metrics():
+    stats = figure_cache.stats()
+    prefix = f'{instrumentation.PREFIX}_figure_cache'
+    return [(f'{prefix}_{name}', 'gauge', {}, stats[name]) for name in ('entries', 'bytes', 'max_bytes')] + \
+        [(f'{prefix}_{name}_total', 'counter', {}, stats[name]) for name in ('hits', 'misses', 'disk_hits', 'evictions')]
+
+
+if app.config['CATALOG_WATCH_INTERVAL']:
+    catalog.start_watcher(app.config['CATALOG_WATCH_INTERVAL'])
 
 @app.route('/')
 def index():
-    plots_html = generate_plots(df)
-    return render_template('index.html', plots=plots_html)
+    mode = request.args.get('mode', app.config['INDEX_MODE'])
+    star_index = get_star_index()
+    df = star_index.frame
+    systems = star_index.systems
+    if mode == 'lazy':
+        return render_template('index.html', systems=systems, lazy=True, plots=[],
+                               plot_config=plot_config, plotly_cdn_url=plotly_cdn_url)
+    if mode == 'stream':
+        # each system is rendered as the template reaches it, so the first one goes out
+        # while the rest are still being built and only one figure is held at a time
+        plots = iter_plots(df, cache=figure_cache, star_index=star_index, workers=app.config['RENDER_WORKERS'])
+        return stream_template('index.html', systems=systems, plots=plots)
+
+    plots_html = generate_plots(df, cache=figure_cache, star_index=star_index, workers=app.config['RENDER_WORKERS'])
+    return render_template('index.html', systems=systems, plots=[plots_html])
+
+
+@app.route('/api/system/<star_system>/figure.json')
+def system_figure_json(star_system):
+    star_index = get_star_index()
+    system = star_index.lookup(star_system)
+
+    if system is None:
+        return {'error': f"No data available for {star_system}"}, 404
+
+    figure_json = generate_system_json(system.name, star_index.rows(system), cache=figure_cache)
+    return Response(figure_json, mimetype='application/json')
 
 
 @app.route('/<star_system>')
 def show_star_system(star_system):
-    star_data = df[df['S_NAME'] == star_system]
+    system = get_star_index().lookup(star_system)
 
-    if star_data.empty:
+    if system is None:
         return f"No data available for {star_system}", 404
-    star_info = star_data.iloc[0]
 
-    return render_template('star_systems.html', star_system=star_system, star_info=star_info)
+    return render_template('star_systems.html', star_system=system.name, star_info=system.info)
 
+# ?frames=parametric sends the orbital elements instead of animation frames and
+# moves the planets in the browser (orbits.js)
 @app.route('/<star_system>_vis')
 def show_star_system_vis(star_system):
-    star_data = df[df['S_NAME'] == star_system]
+    star_index = get_star_index()
+    system = star_index.lookup(star_system)
 
-    if star_data.empty:
+    if system is None:
         return f"No data available for {star_system}", 404
 
-    plots_html = generate_plots(star_data)  # Call the function from plotting.py for this star system
-    return render_template('star_system_vis.html', plots=plots_html, star_system=star_system)
+    frame_mode = request.args.get('frames', 'delta')
+    if frame_mode not in FRAME_MODES:
+        return f"frames must be one of {', '.join(FRAME_MODES)}", 400
+
+    star_data = star_index.rows(system)
+    plots_html = generate_system_html(system.name, star_data, frame_mode=frame_mode, cache=figure_cache)  # Call the function from plotting.py for this star system
+    return render_template('star_system_vis.html', plots=plots_html, star_system=system.name,
+                           parametric=frame_mode == 'parametric')
 
 if __name__ == '__main__':
     app.run(debug=True)
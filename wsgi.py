@@ -0,0 +1,87 @@
+import gc
+import logging
+import os
+
+import catalog
+import dash_app
+import galaxy
+import instrumentation
+import search
+from fast_figure import default_template
+from test import generate_system_html, generate_system_json
+from vis import app, dashboard, figure_cache
+
+#Production entry point for a pre-forking server (gunicorn.conf.py next to this file):
+#    gunicorn wsgi:application
+#Importing this module loads the catalog and builds everything the requests only read
+#(star index, search and galaxy indexes, dashboard figures, ETag versions and, with
+#PRELOAD_FIGURES, the rendered figure of every system) once in the parent process.
+#gc.freeze() then moves all of it out of the collector's reach, so the workers forked
+#afterwards share those pages instead of copying them the first time a collection
+#walks them. The catalog columns themselves are pages of the memory-mapped column
+#store (catalog.py), which the page cache shares even between separate servers.
+
+logger = logging.getLogger(__name__)
+
+# renders every system into figure_cache before forking (bounded by its max_bytes)
+app.config.setdefault('PRELOAD_FIGURES', True)
+
+# every chart the dashboard page asks for while it loads, per DASHBOARD_MODE
+DASHBOARD_CHARTS = {
+    'client': ['client_dataset', 'habitability_bar', 'heatmap'],
+    'server': ['habitability_bar', 'heatmap'],
+}
+
+
+def _catalog_stamp():
+    stat = os.stat(catalog.CATALOG_PATH)
+    return stat.st_size, stat.st_mtime_ns
+
+
+_preloaded_stamp = None
+
+
+def preload():
+    global _preloaded_stamp
+    # no thread may hold a lock across the fork, the workers start their own watchers
+    catalog.stop_watcher()
+    _preloaded_stamp = _catalog_stamp()
+    star_index = catalog.get_star_index()
+    search.get_search_index()
+    default_template()
+
+    versions = app.extensions['http_cache']
+    versions.dataset()
+    for system in star_index.systems:
+        versions.system(system.name)
+
+    with app.test_request_context():
+        galaxy.get_galaxy_index().figure_json()
+    dashboard.load()
+    for chart in DASHBOARD_CHARTS[app.config['DASHBOARD_MODE']]:
+        dash_app.figure_store.get(chart)
+
+    if app.config['PRELOAD_FIGURES']:
+        for name, rows in star_index.partitions():
+            generate_system_json(name, rows, cache=figure_cache)
+            generate_system_html(name, rows, cache=figure_cache)
+
+    # the warm-up is not traffic, every worker starts with empty metrics
+    instrumentation.REGISTRY.clear()
+    instrumentation.recent_renders.clear()
+    gc.collect()
+    gc.freeze()
+    logger.info("Preloaded %d star systems, %d figures cached", len(star_index), figure_cache.stats()['entries'])
+
+
+#Called in every worker right after the fork. A worker forked after the CSV changed
+#(a restart or a recycled worker) reloads it, the master's copy is never refreshed.
+def post_fork():
+    if _catalog_stamp() != _preloaded_stamp:
+        catalog.reload_catalog()
+    if app.config['CATALOG_WATCH_INTERVAL']:
+        catalog.start_watcher(app.config['CATALOG_WATCH_INTERVAL'])
+
+
+preload()
+application = app